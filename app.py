@@ -1,9 +1,12 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
 from flask_socketio import SocketIO, emit
 import threading
 import time
-from live_ids import capture_packets, get_active_interface
-import queue
+from live_ids import get_active_interface, load_model, open_session
+from live_pipeline import LivePipeline
+from broadcaster import FrameBroadcaster
+from timeseries import TrafficStats
+from metrics import metrics, overhead
 import logging
 
 # Configure logging
@@ -16,15 +19,21 @@ app.config['SECRET_KEY'] = 'your-secret-key-here'  # Required for SocketIO
 socketio = SocketIO(app, 
                    cors_allowed_origins="*",
                    async_mode='threading',
-                   logger=True,
-                   engineio_logger=True)
+                   logger=False,
+                   engineio_logger=False)
 
 # Global variables
 capture_thread = None
 thread_lock = threading.Lock()
-packet_queue = queue.Queue(maxsize=100)  # Buffer for packet data
 is_capturing = False
 selected_interface = None
+STOP_TIMEOUT = 5.0  # Seconds stop_capture waits for the capture thread to finish
+capture_session = None  # Long-lived CaptureSession, started once per start_capture
+pipeline = None  # capture -> flow -> inference stages feeding this thread
+# Verdicts are coalesced into one 'packet_data' frame per 250 ms instead of one emit per batch
+broadcaster = FrameBroadcaster(socketio.emit, sleep=socketio.sleep)
+# Rolling 1s/1m/1h counters for trend charts, kept in fixed-size ring buffers
+traffic_stats = TrafficStats()
 
 @app.route('/')
 def index():
@@ -37,82 +46,109 @@ def index():
         return render_template('index.html', interface=None, error=str(e))
 
 def background_capture():
-    """Background thread that captures packets"""
-    global is_capturing
+    """Background thread that streams packets from one long-lived capture session"""
+    global is_capturing, capture_session, pipeline
     
     logger.info("Starting packet capture thread")
     socketio.emit('capture_status', {'status': 'started', 'interface': selected_interface})
     
-    # Initialize counters for total statistics
-    total_benign = 0
-    total_malicious = 0
-    
     while is_capturing:
+        current = None
         try:
-            if selected_interface:
-                # Capture a small batch of packets
-                packets = capture_packets(selected_interface, packet_count=5)
-                if packets:
-                    logger.info(f"Captured {len(packets)} packets")
-                
-                if packets:
-                    # Calculate batch statistics
-                    benign_count = sum(1 for p in packets if p.get("label") == "Benign")
-                    malicious_count = sum(1 for p in packets if p.get("label") == "Malicious")
-                    
-                    # Update total statistics
-                    total_benign += benign_count
-                    total_malicious += malicious_count
-                    
-                    # Format packet data for display
-                    formatted_packets = []
-                    for p in packets:
-                        formatted_packet = {
-                            "size": p.get("pkt_size_mean", 0),
-                            "syn": p.get("syn_flag_count", 0),
-                            "ack": p.get("ack_flag_count", 0),
-                            "fin": p.get("fin_flag_count", 0),
-                            "psh": p.get("psh_flag_count", 0),
-                            "label": p.get("label", "Unknown")
-                        }
-                        formatted_packets.append(formatted_packet)
-                    
-                    # Create data packet for frontend
-                    data = {
-                        'packets': formatted_packets,
-                        'stats': {
-                            'benign': total_benign,
-                            'malicious': total_malicious,
-                            'total': total_benign + total_malicious
-                        },
-                        'batch_stats': {
-                            'benign': benign_count,
-                            'malicious': malicious_count,
-                            'total': len(packets)
-                        }
-                    }
-                    
-                    # Log the data being sent
-                    logger.info(f"Sending data: {data}")
-                    
-                    # Emit to all clients
-                    socketio.emit('packet_data', data)
-            
-            # Small delay to prevent CPU overuse
-            time.sleep(0.5)
-            
+            if not selected_interface:
+                time.sleep(0.5)
+                continue
+
+            capture_session = open_session(selected_interface)
+            broadcaster.session = capture_session
+            # Own flow table and predictor buffers: the previous pipeline's threads are done with theirs
+            current = pipeline = LivePipeline(capture_session, load_model().copy()).start()
+            for packets in current.flows():
+                if not is_capturing:
+                    break
+                logger.debug(f"Classified {len(packets)} flows")
+                broadcaster.add(packets)
+                traffic_stats.record(packets)
+
         except Exception as e:
             logger.error(f"Error in capture thread: {e}")
+            metrics.inc("errors", stage="capture")
             socketio.emit('capture_error', {'error': str(e)})
             time.sleep(1)  # Wait a bit longer on error
+        finally:
+            if current is not None:
+                if not current.stop(timeout=STOP_TIMEOUT):
+                    logger.warning(f"Pipeline stages still running {STOP_TIMEOUT:.0f}s after stop")
+            elif capture_session:
+                capture_session.stop()
     
     logger.info("Packet capture thread stopped")
 
+@app.route('/capture_stats')
+def capture_stats():
+    """Uptime, restart and loss counters of the current capture session"""
+    if capture_session is None:
+        return jsonify({'running': False})
+    return jsonify(capture_session.stats())
+
+@app.route('/pipeline_stats')
+def pipeline_stats():
+    """Queue depths and drop counters of the live pipeline stages"""
+    if pipeline is None:
+        return jsonify({'running': False})
+    return jsonify(pipeline.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage latency quantiles, counters and queue depths in Prometheus text format"""
+    text = metrics.render()
+    if pipeline is not None:
+        lines = ["# TYPE ciphereye_queue_depth gauge"]
+        for name, q in pipeline.stats()['queues'].items():
+            lines.append(f'ciphereye_queue_depth{{queue="{name}"}} {q["depth"]}')
+        lines.append(f'ciphereye_queue_depth{{queue="deferred"}} {len(pipeline.deferred)}')
+        text += "\n".join(lines) + "\n"
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/timeseries')
+def timeseries():
+    """Rolling traffic counters: ?resolution=1s|1m|1h&last=N slots"""
+    resolution = request.args.get('resolution', '1s')
+    last = request.args.get('last', type=int)
+    try:
+        return jsonify(traffic_stats.query(resolution, last))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 400
+
+def warm_start():
+    """Load the model and discover the interface in the background so the
+    dashboard is served immediately and the first capture does not wait."""
+    def prefetch():
+        try:
+            get_active_interface()
+        except Exception as e:
+            logger.warning(f"Interface discovery failed: {e}")
+        try:
+            load_model()
+        except Exception as e:
+            logger.error(f"Model warm-up failed: {e}")
+        # Timing cost reported by /metrics; measured once, off the request path
+        overhead()
+
+    socketio.start_background_task(prefetch)
+
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
     logger.info("Client connected")
     emit('connect_response', {'status': 'connected'})
+    # Recent frames, so the counters and table are filled without waiting for traffic
+    emit('packet_backfill', broadcaster.backfill())
+
+@socketio.on('backfill')
+def handle_backfill():
+    """Resend the frame history, e.g. after the client noticed a gap in seq"""
+    emit('packet_backfill', broadcaster.backfill())
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -130,6 +166,7 @@ def handle_start_capture():
                 selected_interface = get_active_interface()
                 is_capturing = True
                 capture_thread = socketio.start_background_task(background_capture)
+                broadcaster.start(socketio.start_background_task)
                 emit('capture_status', {
                     'status': 'started',
                     'interface': selected_interface
@@ -152,10 +189,19 @@ def handle_stop_capture():
     try:
         with thread_lock:
             is_capturing = False
-            if capture_thread:
-                # Let the capture thread finish naturally
-                time.sleep(1)
-            emit('capture_status', {'status': 'stopped'})
+            if capture_session:
+                # Kills tshark so the streaming loop in the capture thread returns
+                capture_session.stop()
+            if capture_thread is not None:
+                capture_thread.join(timeout=STOP_TIMEOUT)
+                if capture_thread.is_alive():
+                    logger.warning(f"Capture thread still running {STOP_TIMEOUT:.0f}s after stop")
+            # After the capture thread: its last verdicts go out in a final frame
+            broadcaster.stop(timeout=STOP_TIMEOUT)
+            emit('capture_status', {
+                'status': 'stopped',
+                'session': capture_session.stats() if capture_session else None
+            })
             logger.info("Stopped packet capture")
     except Exception as e:
         logger.error(f"Error stopping capture: {e}")
@@ -164,6 +210,7 @@ def handle_stop_capture():
 if __name__ == "__main__":
     try:
         logger.info("Starting CipherEye IDS Server...")
+        warm_start()
         # Start the server with specific host and port
         socketio.run(app, 
                     host='127.0.0.1',
@@ -176,3 +223,5 @@ if __name__ == "__main__":
         if capture_thread and capture_thread.is_alive():
             is_capturing = False
             capture_thread.join(timeout=5)
+    finally:
+        broadcaster.stop(timeout=1)
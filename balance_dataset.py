@@ -1,57 +1,86 @@
-import pandas as pd
-from sklearn.utils import resample
 import os
-import random
+import argparse
+import pandas as pd
+
+from dataset_io import (write_table, iter_table_chunks, list_tables, table_rows,
+                        normalize_labels)
+from sampling import ClassReservoir, WeightedClassReservoir
+from schema import report_memory
+from profiling import add_profile_argument, start_profile, mark
 
 # Paths
-INPUT_FILE = "./merged_features/merged_features.csv"
-OUTPUT_FILE = "./balanced_dataset/balanced_dataset.csv"
+INPUT_FILE = "./merged_features/merged_features.parquet"
+FEATURES_DIR = "./features/"
+OUTPUT_FILE = "./balanced_dataset/balanced_dataset.parquet"
+
+# Rows kept per class, and the seed that makes the sample reproducible
+TARGET_SIZE = 200_000
+SEED = 42
+CHUNK_ROWS = 250_000
+
+
+def balance_stream(chunks, reservoir):
+    """One pass over the chunks; memory is one chunk plus the reservoirs."""
+    for chunk in chunks:
+        # Convert labels to numeric (Benign=0, Attack=1)
+        chunk["label"] = normalize_labels(chunk["label"])
+        reservoir.update(chunk)
+    return reservoir
 
 
-# Make sure the output folder exists
-os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+def merged_chunks(path, chunk_rows):
+    yield from iter_table_chunks(path, chunk_rows)
 
-# Load merged dataset
-df = pd.read_csv(INPUT_FILE)
-print(df.head())
-# Convert labels to numeric (Benign=0, Attack=1)
-df['label'] = df['label'].apply(lambda x: 0 if x == 'Benign' else 1)
 
-# Check label counts before balancing
-print("Before balancing:")
-print(df['label'].value_counts())
+def per_day_chunks(directory, chunk_rows):
+    """Chunks from each day's feature table, weighted by 1 / rows in that day."""
+    files = list_tables(directory)
+    for f in files:
+        path = os.path.join(directory, f)
+        weight = 1.0 / max(table_rows(path), 1)
+        for chunk in iter_table_chunks(path, chunk_rows):
+            yield chunk.assign(_weight=weight)
 
-# Separate majority and minority classes (now using numbers)
-df_benign = df[df['label'] == 0]
-df_attack = df[df['label'] == 1]
 
-# Decide a slightly random limit for attack samples (e.g., ~200k ± 1000)
-target_attack_size = random.randint(199000, 201000)
-print(f"\n🔹 Target attack size: {target_attack_size}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Balance benign/attack flows in one streaming pass")
+    parser.add_argument("--target", type=int, default=TARGET_SIZE,
+                        help="Rows per class (both classes are cut to the smaller one)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--per-day", action="store_true",
+                        help=f"Read day files from {FEATURES_DIR} and give every day an equal share")
+    parser.add_argument("--csv", action="store_true", help="Also write CSV copies")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    start_profile("balance_dataset", "sample")
 
-# Downsample attack if it is larger than target size
-if len(df_attack) > target_attack_size:
-    df_attack = df_attack.sample(n=target_attack_size, random_state=42)
-else:
-    target_attack_size = len(df_attack)  # keep full attack size if already smaller
+    print(f"🔹 Target size per class: {args.target} (seed {args.seed})")
+    if args.per_day:
+        reservoir = WeightedClassReservoir(args.target, seed=args.seed)
+        chunks = per_day_chunks(FEATURES_DIR, args.chunk_rows)
+    else:
+        reservoir = ClassReservoir(args.target, seed=args.seed)
+        chunks = merged_chunks(INPUT_FILE, args.chunk_rows)
+    balance_stream(chunks, reservoir)
 
-# Undersample benign to match attack size
-df_benign_downsampled = resample(df_benign,
-                                 replace=False,
-                                 n_samples=target_attack_size,
-                                 random_state=42)
+    # Check label counts before balancing
+    print("Before balancing:")
+    print(pd.Series(reservoir.seen, name="count").sort_index())
 
-# Combine and shuffle
-df_balanced = pd.concat([df_benign_downsampled, df_attack])
-df_balanced = df_balanced.sample(frac=1, random_state=42).reset_index(drop=True)
+    # Cut both classes to the same size and shuffle
+    mark("balance and shuffle")
+    df_balanced = reservoir.result(balance=True, shuffle_seed=args.seed)
+    report_memory("balanced dataset", df_balanced)
 
-# Save balanced dataset
-df_balanced.to_csv(OUTPUT_FILE, index=False)
+    # Save balanced dataset (CSV only with --csv)
+    mark("write")
+    write_table(df_balanced, OUTPUT_FILE)
 
-# Check label counts after balancing
-print("\nAfter balancing:")
-print("Benign vs Attack counts:")
-print("Benign = 0 | Attack = 1")
-print(df_balanced['label'].value_counts())
+    # Check label counts after balancing
+    print("\nAfter balancing:")
+    print("Benign vs Attack counts:")
+    print("Benign = 0 | Attack = 1")
+    print(df_balanced['label'].value_counts())
 
-print(f"\nBalanced dataset saved to {OUTPUT_FILE}")
+    print(f"\nBalanced dataset saved to {OUTPUT_FILE}")
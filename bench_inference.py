@@ -0,0 +1,78 @@
+import argparse
+import time
+import joblib
+import numpy as np
+
+from flows import FLOW_FEATURES
+from inference import BatchPredictor
+
+# ---------------------------
+# Paths
+# ---------------------------
+MODEL_FILE = "./results/xgboost_model.pkl"
+SCALER_FILE = "./results/scaler.pkl"
+
+BATCH_SIZES = [1, 8, 32, 128, 512, 2048]
+
+
+def synthetic_rows(n, seed=42):
+    """Flow feature dicts with roughly realistic magnitudes."""
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(0, 1500, size=(n, 3)).astype(float)
+    rows = []
+    for i in range(n):
+        lo, hi = sorted(sizes[i, :2])
+        rows.append({
+            "pkt_size_min": lo,
+            "pkt_size_max": hi,
+            "pkt_size_mean": (lo + hi) / 2,
+            "pkt_size_std": (hi - lo) / 4,
+            "flow_duration": float(rng.exponential(1e6)),
+            "flow_iat_mean": float(rng.exponential(1e5)),
+            "flow_iat_std": float(rng.exponential(1e5)),
+            "syn_flag_count": int(rng.integers(0, 2)),
+            "ack_flag_count": int(rng.integers(0, 20)),
+            "fin_flag_count": int(rng.integers(0, 2)),
+            "psh_flag_count": int(rng.integers(0, 10)),
+            "fwd_header_length": int(rng.integers(20, 2000)),
+            "bwd_header_length": int(rng.integers(0, 2000)),
+        })
+    return rows
+
+
+def bench_batched(model, scaler, rows, batch_size):
+    predictor = BatchPredictor(model, scaler, batch_size=batch_size, max_delay=float("inf"))
+    start = time.perf_counter()
+    for features in rows:
+        predictor.add(dict(features))
+    predictor.flush()
+    return len(rows) / (time.perf_counter() - start)
+
+
+def bench_per_row(model, scaler, rows):
+    predictor = BatchPredictor(model, scaler)
+    start = time.perf_counter()
+    for features in rows:
+        predictor.predict_one(dict(features))
+    return len(rows) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rows/sec of flow scoring by batch size")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--scaler", default=SCALER_FILE)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    scaler = joblib.load(args.scaler)
+    rows = synthetic_rows(args.rows)
+    assert len(FLOW_FEATURES) == scaler.n_features_in_
+
+    # The per-row path is slow, so time it on a slice
+    per_row = bench_per_row(model, scaler, rows[:min(len(rows), 2000)])
+    print(f"{'mode':<16}{'rows/sec':>12}{'speedup':>10}")
+    print(f"{'per-row':<16}{per_row:>12.0f}{1.0:>10.1f}")
+    for batch_size in BATCH_SIZES:
+        rate = bench_batched(model, scaler, rows, batch_size)
+        print(f"{f'batch={batch_size}':<16}{rate:>12.0f}{rate / per_row:>10.1f}")
@@ -0,0 +1,162 @@
+import os
+import argparse
+import time
+import joblib
+import numpy as np
+import pandas as pd
+
+from train_cache import load_training_data
+from train_model import MODELS, MODEL_CACHE_DIR, OUTPUT_CSV, cache_key, cached_path
+
+BATCH_SIZES = [32, 256, 2048]
+LATENCY_CALLS = 1000
+WARMUP_CALLS = 20
+
+
+def thread_counts():
+    """1, 2, 4, ... up to the number of cores."""
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+class EnsembleModel:
+    """Soft voting (meta=None) or stacking over already fitted base models."""
+
+    def __init__(self, models, meta=None):
+        self.models = models
+        self.meta = meta
+
+    def set_threads(self, threads):
+        for m in self.models:
+            set_threads(m, threads)
+
+    def predict_proba(self, X):
+        proba = np.column_stack([predict_fn(m)(X)[:, 1] for m in self.models])
+        if self.meta is not None:
+            return self.meta.predict_proba(proba)
+        p = proba.mean(axis=1)
+        return np.column_stack([1 - p, p])
+
+
+def set_threads(model, threads):
+    if isinstance(model, EnsembleModel):
+        model.set_threads(threads)
+        return
+    if type(model).__module__.startswith("catboost"):
+        # CatBoost refuses set_params once fitted; predict_proba takes thread_count instead
+        model._bench_threads = threads
+    elif "n_jobs" in model.get_params():
+        model.set_params(n_jobs=threads)
+
+
+def predict_fn(model):
+    threads = getattr(model, "_bench_threads", None)
+    if threads is not None:
+        return lambda X: model.predict_proba(X, thread_count=threads)
+    return model.predict_proba
+
+
+def load_timed(path):
+    start = time.perf_counter()
+    model = joblib.load(path)
+    return model, time.perf_counter() - start
+
+
+def single_row_latency(model, X, calls=LATENCY_CALLS):
+    """p50/p99 of one-row predict_proba calls, in milliseconds."""
+    predict = predict_fn(model)
+    rows = [X[i % len(X)][None, :] for i in range(calls + WARMUP_CALLS)]
+    for row in rows[:WARMUP_CALLS]:
+        predict(row)
+    times = np.empty(calls)
+    for i, row in enumerate(rows[WARMUP_CALLS:]):
+        start = time.perf_counter()
+        predict(row)
+        times[i] = time.perf_counter() - start
+    return np.percentile(times, 50) * 1e3, np.percentile(times, 99) * 1e3
+
+
+def batch_throughput(model, X, batch_size, min_rows=20000):
+    """Rows/sec scoring X in batches of `batch_size` (X is cycled up to min_rows)."""
+    predict = predict_fn(model)
+    reps = max(1, -(-min_rows // len(X)))
+    X = np.ascontiguousarray(np.tile(X, (reps, 1)))
+    predict(X[:batch_size])
+    start = time.perf_counter()
+    for i in range(0, len(X), batch_size):
+        predict(X[i:i + batch_size])
+    return len(X) / (time.perf_counter() - start)
+
+
+def load_models():
+    """Fitted models from train_model.py's cache: name -> (model, load seconds, bytes)."""
+    loaded = {}
+    for name in MODELS:
+        path = cached_path(name, cache_key(name)) + ".pkl"
+        if not os.path.exists(path):
+            print(f"⚠️ No fitted {name} in {MODEL_CACHE_DIR}, run train_model.py first")
+            continue
+        model, load_time = load_timed(path)
+        loaded[name] = (model, load_time, os.path.getsize(path))
+    if len(loaded) == len(MODELS):
+        bases = [loaded[n] for n in MODELS]
+        models = [m for m, _, _ in bases]
+        load_time = sum(t for _, t, _ in bases)
+        size = sum(s for _, _, s in bases)
+        loaded["Ensemble (Voting)"] = (EnsembleModel(models), load_time, size)
+        meta_path = os.path.join(MODEL_CACHE_DIR, "stacking_meta.pkl")
+        if os.path.exists(meta_path):
+            stacking, meta_time = load_timed(meta_path)
+            loaded["Ensemble (Stacking)"] = (EnsembleModel(models, stacking["meta"]),
+                                             load_time + meta_time, size + os.path.getsize(meta_path))
+    return loaded
+
+
+def bench_model(model, X, batch_sizes=BATCH_SIZES, threads=None):
+    threads = threads or thread_counts()
+    row = {}
+    set_threads(model, 1)
+    p50, p99 = single_row_latency(model, X)
+    row["Latency p50 (ms)"] = p50
+    row["Latency p99 (ms)"] = p99
+    for batch_size in batch_sizes:
+        row[f"Throughput batch={batch_size} (rows/s)"] = batch_throughput(model, X, batch_size)
+    # Thread scaling at the largest batch size
+    for t in threads:
+        set_threads(model, t)
+        row[f"Throughput {t} threads (rows/s)"] = batch_throughput(model, X, batch_sizes[-1])
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serving cost of every model in train_model.py")
+    parser.add_argument("--rows", type=int, default=2048, help="Test rows used as the benchmark input")
+    parser.add_argument("--output", default=OUTPUT_CSV, help="Results CSV to add the columns to")
+    args = parser.parse_args()
+
+    data = load_training_data()
+    X = np.ascontiguousarray(data.X_test[:args.rows])
+    rows = []
+    for name, (model, load_time, size) in load_models().items():
+        print(f"\n🔹 Benchmarking {name}...")
+        row = {"Model": name, "Load time (s)": load_time, "Size (MB)": size / 2**20}
+        row.update(bench_model(model, X))
+        print(f"   p50 {row['Latency p50 (ms)']:.3f} ms, p99 {row['Latency p99 (ms)']:.3f} ms, "
+              f"batch={BATCH_SIZES[-1]}: {row[f'Throughput batch={BATCH_SIZES[-1]} (rows/s)']:.0f} rows/s, "
+              f"load {load_time:.3f}s, {row['Size (MB)']:.2f} MB")
+        rows.append(row)
+
+    bench = pd.DataFrame(rows)
+    if os.path.exists(args.output):
+        # Replace earlier benchmark columns, keep the accuracy metrics
+        results = pd.read_csv(args.output)
+        results = results[[c for c in results.columns if c == "Model" or c not in bench.columns]]
+        results = results.merge(bench, on="Model", how="left")
+    else:
+        results = bench
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"\n✅ Benchmark results saved to {args.output}")
@@ -0,0 +1,85 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Each probe runs in a fresh interpreter so import costs are measured cold
+FIRST_VERDICT = """
+import json, time
+start = time.perf_counter()
+import live_ids
+imported = time.perf_counter()
+predictor = live_ids.load_model()
+loaded = time.perf_counter()
+flows = predictor.add({"pkt_size_mean": 60.0, "syn_flag_count": 1}) + predictor.flush()
+verdict = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "load_model": loaded - imported,
+    "first_verdict": verdict - loaded,
+    "import_to_first_verdict": verdict - start,
+    "label": flows[0]["label"],
+}))
+"""
+
+SERVE_DASHBOARD = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get("/")
+served = time.perf_counter()
+second = app.app.test_client().get("/")
+served_again = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "first_request": served - imported,
+    "time_to_serve_dashboard": served - start,
+    "second_request": served_again - served,
+    "status": response.status_code,
+}))
+"""
+
+
+def run_probe(code, repeat):
+    """Run a probe `repeat` times and keep the fastest run of each timing."""
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else "probe failed")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None:
+            best = result
+        else:
+            best = {k: min(v, best[k]) if isinstance(v, float) else v for k, v in result.items()}
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cold-start timings: import-to-first-verdict and time-to-serve-dashboard. "
+                    "Run on two checkouts to compare before/after.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--report", help="Also write the timings as JSON to this path")
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in [("live_ids", FIRST_VERDICT), ("dashboard", SERVE_DASHBOARD)]:
+        try:
+            results[name] = run_probe(code, args.repeat)
+        except Exception as e:
+            results[name] = {"error": str(e)}
+
+    for name, timings in results.items():
+        print(f"\n🔹 {name}")
+        for key, value in timings.items():
+            if isinstance(value, float):
+                print(f"   {key:<24} {value * 1000:9.1f} ms")
+            else:
+                print(f"   {key:<24} {value}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Report saved to {args.report}")
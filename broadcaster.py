@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+from collections import deque
+
+from metrics import metrics
+
+# Push one frame every FRAME_INTERVAL seconds, with at most MAX_PACKETS sample
+# rows, and keep the last HISTORY_FRAMES frames for clients that connect late
+FRAME_INTERVAL = 0.25
+MAX_PACKETS = 20
+HISTORY_FRAMES = 240  # one minute at 250 ms
+
+
+def format_packet(p):
+    """The fields the dashboard table shows for one classified flow."""
+    return {
+        "size": p.get("pkt_size_mean", 0),
+        "syn": p.get("syn_flag_count", 0),
+        "ack": p.get("ack_flag_count", 0),
+        "fin": p.get("fin_flag_count", 0),
+        "psh": p.get("psh_flag_count", 0),
+        "label": p.get("label", "Unknown"),
+    }
+
+
+class FrameBroadcaster:
+    """Coalesce verdicts into fixed-interval frames and push them to all clients.
+
+    The capture thread only calls add(), which bumps counters and keeps a
+    uniform reservoir sample of at most `max_packets` rows. A single
+    background loop turns that into one frame per `interval`:
+
+        {"seq", "time", "delta": {benign, malicious, total},
+         "packets": [...sample...], "unsampled": rows left out, "session": {...}}
+
+    Counters are deltas since the previous frame. Frames are kept in a ring
+    of `history` entries; backfill() returns them together with the totals
+    from before the oldest one, so a new client rebuilds the running totals
+    without touching the capture.
+    """
+
+    def __init__(self, emit, sleep=time.sleep, interval=FRAME_INTERVAL,
+                 max_packets=MAX_PACKETS, history=HISTORY_FRAMES, event="packet_data"):
+        self.emit = emit
+        self.sleep = sleep
+        self.interval = interval
+        self.max_packets = max_packets
+        self.event = event
+        self.frames = deque(maxlen=history)
+        self.base = {"benign": 0, "malicious": 0, "total": 0}  # totals before frames[0]
+        self.session = None  # anything with .stats(), sampled once per frame
+        self.seq = 0
+        self.frames_sent = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+        self._reset()
+        self._running = False
+        self._generation = 0  # Bumped by start()/stop(); a loop runs while its own is current
+        self._task = None
+
+    def _reset(self):
+        self._benign = 0
+        self._malicious = 0
+        self._seen = 0
+        self._sample = []
+
+    def add(self, flows):
+        """Count a batch of classified flows and offer them to the frame's sample."""
+        with self._lock:
+            for p in flows:
+                label = p.get("label")
+                if label == "Benign":
+                    self._benign += 1
+                elif label == "Malicious":
+                    self._malicious += 1
+                # Reservoir sampling (Algorithm R): every row is equally likely to be shown
+                self._seen += 1
+                if len(self._sample) < self.max_packets:
+                    self._sample.append(p)
+                else:
+                    j = self._rng.randrange(self._seen)
+                    if j < self.max_packets:
+                        self._sample[j] = p
+
+    def flush(self):
+        """Close the current frame; returns it, or None if nothing arrived."""
+        with self._lock:
+            if self._seen == 0:
+                return None
+            benign, malicious, seen, sample = self._benign, self._malicious, self._seen, self._sample
+            self._reset()
+            self.seq += 1
+            frame = {
+                "seq": self.seq,
+                "time": time.strftime("%H:%M:%S"),
+                "delta": {"benign": benign, "malicious": malicious, "total": seen},
+                "packets": [format_packet(p) for p in sample],
+                "unsampled": seen - len(sample),
+                "session": self.session.stats() if self.session is not None else None,
+            }
+            if len(self.frames) == self.frames.maxlen:
+                evicted = self.frames[0]["delta"]
+                for key in self.base:
+                    self.base[key] += evicted[key]
+            self.frames.append(frame)
+            return frame
+
+    def backfill(self):
+        """Everything a client needs to catch up: base totals plus the ring."""
+        with self._lock:
+            return {"base": dict(self.base), "frames": list(self.frames)}
+
+    def totals(self):
+        with self._lock:
+            totals = dict(self.base)
+            for frame in self.frames:
+                for key in totals:
+                    totals[key] += frame["delta"][key]
+            return totals
+
+    def _send(self, frame):
+        if frame is not None:
+            t0 = time.perf_counter()
+            self.emit(self.event, frame)
+            metrics.observe("emit", time.perf_counter() - t0)
+            self.frames_sent += 1
+
+    def run(self, generation=0):
+        """Frame loop; run it as a background task. Ends after one last frame on stop()."""
+        next_tick = time.monotonic()
+        while self._generation == generation:
+            next_tick += self.interval
+            self._send(self.flush())
+            self.sleep(max(0.0, next_tick - time.monotonic()))
+        # Verdicts added since the last tick, e.g. a stopped capture's final batch
+        self._send(self.flush())
+
+    def start(self, start_task):
+        """Start the frame loop once, via e.g. socketio.start_background_task."""
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+            self._generation += 1
+            generation = self._generation
+        self._task = start_task(self.run, generation)
+        return True
+
+    def stop(self, timeout=None):
+        """End the frame loop; waits up to `timeout` for it if the task can be joined."""
+        with self._lock:
+            self._running = False
+            self._generation += 1
+        task, self._task = self._task, None
+        if task is not None and hasattr(task, "join"):
+            task.join(timeout)
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+import pandas as pd
+import pyarrow.parquet as pq
+from sklearn.model_selection import train_test_split
+
+from preprocess import RAW_DIR, projected_columns
+from features import extract_features
+from dataset_io import write_table, normalize_labels
+from sampling import ClassReservoir
+from dedup import GlobalDeduplicator
+from schema import apply_schema, raw_dtypes, drop_non_finite, report_memory, peak_rss_mb, format_mb
+from train_cache import write_cache
+
+# ---------------------------
+# Paths and defaults
+# ---------------------------
+TRAIN_FILE = "./train_dataset/train.parquet"
+TEST_FILE = "./test_dataset/test.parquet"
+
+CHUNK_ROWS = 250_000
+TARGET_PER_CLASS = 200_000
+SEED = 42
+
+# The five-script flow this replaces, in order
+LEGACY_STEPS = ["preprocess.py", "features.py", "merge_feature.py", "balance_dataset.py", "split_dataset.py"]
+
+
+def iter_chunks(file_path, chunk_rows=CHUNK_ROWS, dedup=None):
+    """Yield cleaned, feature-mapped, labelled chunks of one raw Parquet day file.
+
+    Rows already seen by `dedup` (in this or an earlier file) are dropped.
+    """
+    pf = pq.ParquetFile(file_path)
+    numeric_cols, label_col = projected_columns(pf.schema_arrow.names)
+    if not label_col:
+        print(f"⚠️ No label column found in {file_path}, skipping")
+        return
+    for batch in pf.iter_batches(batch_size=chunk_rows, columns=numeric_cols + [label_col]):
+        df = batch.to_pandas()
+        # Cleaning (same rules as preprocess.py, applied per chunk)
+        df = drop_non_finite(df)
+        df = apply_schema(df, raw_dtypes(numeric_cols))
+        if dedup is not None:
+            df = dedup.filter(df, source=file_path)
+        df = df.rename(columns={label_col: "Label"})
+        # Feature mapping and label normalization
+        features = extract_features(df)
+        features["label"] = normalize_labels(features["label"])
+        yield features
+
+
+def build(files, target=TARGET_PER_CLASS, seed=SEED, test_size=0.2, chunk_rows=CHUNK_ROWS):
+    """One streaming pass over the raw files; only train/test are written."""
+    reservoir = ClassReservoir(target, seed=seed)
+    dedup = GlobalDeduplicator()
+    for path in files:
+        file_rows = 0
+        for chunk in iter_chunks(path, chunk_rows, dedup):
+            file_rows += len(chunk)
+            reservoir.update(chunk)
+        print(f"✅ Streamed {os.path.basename(path)}: {file_rows} clean rows")
+    dedup.report()
+    dedup.close()
+
+    print("\n🔹 Rows seen per class:", dict(sorted(reservoir.seen.items())))
+    balanced = reservoir.result(balance=True, shuffle_seed=seed)
+    report_memory("balanced sample", balanced)
+
+    train_df, test_df = train_test_split(
+        balanced,
+        test_size=test_size,
+        stratify=balanced["label"],
+        random_state=seed
+    )
+    write_table(train_df, TRAIN_FILE)
+    write_table(test_df, TEST_FILE)
+    print(f"✅ Train dataset saved to {TRAIN_FILE} ({len(train_df)} rows)")
+    print(f"✅ Test dataset saved to {TEST_FILE} ({len(test_df)} rows)")
+    write_cache(train_df, test_df, sources=(TRAIN_FILE, TEST_FILE))
+    return train_df, test_df
+
+
+def watch_peak_rss(proc, interval=0.05):
+    """Sample a child's resident memory until it exits; peak in MB, or None without psutil."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    peak = 0
+    try:
+        child = psutil.Process(proc.pid)
+        while proc.poll() is None:
+            info = child.memory_info()
+            # Windows keeps the peak working set; elsewhere sample the current RSS
+            peak = max(peak, getattr(info, "peak_wset", info.rss))
+            time.sleep(interval)
+    except psutil.Error:
+        pass  # Exited between poll() and the read
+    return peak / 2**20
+
+
+def run_measured(args):
+    """Run a command and return (wall seconds, peak RSS in MB or None) for that process alone."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(args)
+    peak = watch_peak_rss(proc)
+    if proc.wait() != 0:
+        raise RuntimeError(f"{' '.join(args)} exited with {proc.returncode}")
+    return time.perf_counter() - start, peak
+
+
+def compare_with_legacy():
+    """Time the five-script flow and this builder, each step in its own process."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    rows = []
+    for script in LEGACY_STEPS:
+        wall, rss = run_measured([sys.executable, os.path.join(here, script)])
+        rows.append(("legacy " + script, wall, rss))
+    legacy_wall = sum(r[1] for r in rows)
+    legacy_rss = None if None in (r[2] for r in rows) else max(r[2] for r in rows)
+    wall, rss = run_measured([sys.executable, os.path.abspath(__file__)])
+
+    print(f"\n{'step':<32}{'wall (s)':>10}{'peak RSS':>16}")
+    for name, w, r in rows:
+        print(f"{name:<32}{w:>10.1f}{format_mb(r):>16}")
+    print(f"{'legacy total':<32}{legacy_wall:>10.1f}{format_mb(legacy_rss):>16}")
+    print(f"{'build_dataset.py':<32}{wall:>10.1f}{format_mb(rss):>16}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream raw day files straight to train/test sets")
+    parser.add_argument("--target", type=int, default=TARGET_PER_CLASS, help="Rows kept per class")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--csv", action="store_true", help="Also write CSV copies")
+    parser.add_argument("--compare-legacy", action="store_true",
+                        help="Report wall time and peak RSS against the five-script flow")
+    args = parser.parse_args()
+
+    if args.compare_legacy:
+        compare_with_legacy()
+    else:
+        start = time.perf_counter()
+        files = sorted(os.path.join(RAW_DIR, f) for f in os.listdir(RAW_DIR) if f.endswith(".parquet"))
+        if not files:
+            print("⚠️ No Parquet files found in ./data/")
+        else:
+            build(files, args.target, args.seed, chunk_rows=args.chunk_rows)
+        print(f"\n⏱️ Wall time: {time.perf_counter() - start:.1f}s, peak RSS: {format_mb(peak_rss_mb())}")
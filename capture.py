@@ -0,0 +1,295 @@
+import asyncio
+import io
+import os
+import subprocess
+import threading
+import time
+import numpy as np
+
+from flows import PacketMeta
+
+# Wait this long before restarting tshark after it exits unexpectedly (seconds)
+RESTART_DELAY = 1.0
+
+# tshark -T fields columns, in output order
+TSHARK_FIELDS = [
+    "frame.time_epoch", "frame.len",
+    "ip.src", "ip.dst", "ipv6.src", "ipv6.dst",
+    "tcp.srcport", "tcp.dstport", "tcp.flags", "tcp.hdr_len", "tcp.len",
+    "udp.srcport", "udp.dstport", "udp.length"
+]
+# Bytes read from tshark's stdout per parse
+CHUNK_SIZE = 1 << 20
+
+
+class CaptureSession:
+    """One long-lived tshark capture that yields packets as a continuous stream.
+
+    The session is started once and `packets()` keeps yielding until `stop()`
+    is called. If tshark dies it is restarted in place, and the gap is
+    recorded so `stats()` can report uptime and an estimate of the packets
+    lost between restarts (gap length x packet rate seen so far).
+    """
+
+    def __init__(self, interface, tshark_path=None, display_filter="tcp", parse=None):
+        self.interface = interface
+        self.tshark_path = tshark_path
+        self.display_filter = display_filter
+        # Optional callable turning a pyshark packet into whatever the next stage wants
+        self.parse = parse
+        self.capture = None
+        self.loop = None
+        self.running = False
+        self.lock = threading.Lock()
+
+        self.started_at = None
+        self.stopped_at = None
+        self.packets_seen = 0
+        self.restarts = 0
+        self.gap_seconds = 0.0
+        self.estimated_lost = 0.0
+
+    def start(self):
+        self.running = True
+        self.started_at = time.time()
+        self.stopped_at = None
+        return self
+
+    def stop(self):
+        """Stop the stream. Safe to call from another thread."""
+        self.running = False
+        self.stopped_at = time.time()
+        with self.lock:
+            cap, loop = self.capture, self.loop
+        if cap is not None and loop is not None and not loop.is_closed():
+            # pyshark reads each packet with loop.run_until_complete(), so a coroutine
+            # scheduled on the capture's own loop runs while packets() waits for tshark;
+            # close_async() ends tshark and the blocked loop wakes up
+            try:
+                asyncio.run_coroutine_threadsafe(cap.close_async(), loop)
+            except RuntimeError:
+                pass  # The loop closed in between: the capture thread is already done
+
+    def _open(self, loop):
+        # Imported here so importing this module (and app.py) stays fast
+        import pyshark
+
+        cap = pyshark.LiveCapture(
+            interface=self.interface,
+            tshark_path=self.tshark_path,
+            display_filter=self.display_filter,
+            include_raw=True,
+            use_json=True,
+            output_file=None,  # Don't save to file
+            eventloop=loop
+        )
+        with self.lock:
+            self.capture = cap
+            self.loop = loop
+        return cap
+
+    def _close(self, cap):
+        with self.lock:
+            self.capture = None
+            self.loop = None
+        try:
+            cap.close()
+        except Exception:
+            pass
+
+    def packets(self):
+        """Yield packets until `stop()` is called, restarting tshark if it exits."""
+        if not self.running:
+            self.start()
+
+        # pyshark needs an event loop owned by the consuming thread
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while self.running:
+                cap = self._open(loop)
+                try:
+                    for packet in cap.sniff_continuously():
+                        if not self.running:
+                            break
+                        self.packets_seen += 1
+                        if self.parse is None:
+                            yield packet
+                        else:
+                            parsed = self.parse(packet)
+                            if parsed is not None:
+                                yield parsed
+                except EOFError:
+                    pass
+                except Exception as e:
+                    if self.running:
+                        print(f"Capture session error: {str(e)}")
+                finally:
+                    self._close(cap)
+
+                if self.running:
+                    self._restart_gap()
+        finally:
+            try:
+                loop.stop()
+                loop.close()
+            except Exception:
+                pass
+
+    def _restart_gap(self):
+        """Account for the time tshark is down between two runs."""
+        self.restarts += 1
+        rate = self.packets_seen / max(time.time() - self.started_at - self.gap_seconds, 1e-6)
+        down_since = time.time()
+        time.sleep(RESTART_DELAY)
+        gap = time.time() - down_since
+        self.gap_seconds += gap
+        self.estimated_lost += gap * rate
+        print(f"🔁 Restarting capture on {self.interface} (restart #{self.restarts})")
+
+    def stats(self):
+        """Session uptime and restart/loss counters."""
+        if self.started_at is None:
+            uptime = 0.0
+        else:
+            uptime = (self.stopped_at or time.time()) - self.started_at
+        return {
+            "interface": self.interface,
+            "running": self.running,
+            "uptime": uptime,
+            "packets": self.packets_seen,
+            "restarts": self.restarts,
+            "gap_seconds": self.gap_seconds,
+            "estimated_lost": int(self.estimated_lost),
+        }
+
+
+def _hex_column(values):
+    """Vectorized parse of tshark hex strings like '0x0012' (missing -> 0)."""
+    digits = np.char.lstrip(values.fillna("0x0").to_numpy(dtype="U"), "0x")
+    width = max(int(np.char.str_len(digits).max(initial=1)), 1)
+    padded = np.char.zfill(digits, width).astype("S")
+    codes = np.frombuffer(padded.tobytes(), dtype=np.uint8).reshape(len(values), width)
+    # '0'-'9' -> 0-9, 'a'-'f' / 'A'-'F' -> 10-15
+    nibbles = np.where(codes <= ord("9"), codes - ord("0"), (codes | 0x20) - ord("a") + 10).astype(np.int64)
+    weights = 16 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    return nibbles @ weights
+
+
+def parse_fields_chunk(data, tcp_only=True):
+    """Parse a block of complete tshark -T fields lines into PacketMeta tuples.
+
+    The whole block goes through one pandas C-parser call and the numeric
+    work is done on NumPy columns; only the final tuples are built per row.
+    """
+    if not data:
+        return []
+    import pandas as pd
+
+    df = pd.read_csv(io.BytesIO(data), sep="\t", header=None, names=TSHARK_FIELDS,
+                     dtype=str, na_filter=True, quoting=3, engine="c")
+    is_tcp = df["tcp.srcport"].notna().to_numpy()
+    is_udp = df["udp.srcport"].notna().to_numpy() & ~is_tcp
+    keep = is_tcp if tcp_only else is_tcp | is_udp
+    if not keep.all():
+        df = df[keep]
+        is_tcp = is_tcp[keep]
+        is_udp = is_udp[keep]
+    if df.empty:
+        return []
+
+    def num(name):
+        return pd.to_numeric(df[name], errors="coerce").fillna(0).to_numpy()
+
+    ts = num("frame.time_epoch").astype(np.float64)
+    length = num("frame.len").astype(np.int64)
+    sport = np.where(is_tcp, num("tcp.srcport"), num("udp.srcport")).astype(np.int64)
+    dport = np.where(is_tcp, num("tcp.dstport"), num("udp.dstport")).astype(np.int64)
+    flags = np.where(is_tcp, _hex_column(df["tcp.flags"]), 0)
+    header_len = np.where(is_tcp, num("tcp.hdr_len"), 8).astype(np.int64)
+    payload_len = np.where(is_tcp, num("tcp.len"), np.maximum(num("udp.length") - 8, 0)).astype(np.int64)
+    src = df["ip.src"].fillna(df["ipv6.src"]).tolist()
+    dst = df["ip.dst"].fillna(df["ipv6.dst"]).tolist()
+    proto = np.where(is_tcp, "TCP", "UDP").tolist()
+
+    return [PacketMeta(*row) for row in zip(
+        ts.tolist(), src, dst, sport.tolist(), dport.tolist(), proto,
+        length.tolist(), payload_len.tolist(), flags.tolist(), header_len.tolist()
+    )]
+
+
+class TsharkFieldsSession(CaptureSession):
+    """Capture with `tshark -T fields` and parse its output in large chunks.
+
+    Keeps tshark's protocol coverage but skips pyshark objects and JSON:
+    stdout is read CHUNK_SIZE bytes at a time and each block of complete
+    lines is parsed column-wise by `parse_fields_chunk`. Pass `path` instead
+    of `interface` to read a pcap file.
+    """
+
+    def __init__(self, interface=None, tshark_path=None, bpf_filter="tcp", path=None, tcp_only=True):
+        super().__init__(interface, tshark_path=tshark_path, display_filter=None)
+        self.bpf_filter = bpf_filter
+        self.path = path
+        self.tcp_only = tcp_only
+        self.process = None
+
+    def command(self):
+        cmd = [self.tshark_path or "tshark", "-l", "-n", "-T", "fields",
+               "-E", "separator=/t", "-E", "occurrence=f"]
+        for field in TSHARK_FIELDS:
+            cmd += ["-e", field]
+        if self.path:
+            cmd += ["-r", self.path]
+            if self.bpf_filter:
+                # Capture filters do not apply when reading files
+                cmd += ["-Y", self.bpf_filter]
+        else:
+            cmd += ["-i", self.interface]
+            if self.bpf_filter:
+                cmd += ["-f", self.bpf_filter]
+        return cmd
+
+    def stop(self):
+        self.running = False
+        self.stopped_at = time.time()
+        proc = self.process
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def packets(self):
+        if not self.running:
+            self.start()
+        while self.running:
+            self.process = subprocess.Popen(self.command(), stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL, bufsize=0)
+            fd = self.process.stdout.fileno()
+            tail = b""
+            try:
+                while self.running:
+                    block = os.read(fd, CHUNK_SIZE)
+                    if not block:
+                        break
+                    # Only parse complete lines; keep the partial last line for the next read
+                    cut = block.rfind(b"\n")
+                    if cut < 0:
+                        tail += block
+                        continue
+                    data, tail = tail + block[:cut + 1], block[cut + 1:]
+                    for pkt in parse_fields_chunk(data, self.tcp_only):
+                        self.packets_seen += 1
+                        yield pkt
+                for pkt in parse_fields_chunk(tail, self.tcp_only):
+                    self.packets_seen += 1
+                    yield pkt
+            finally:
+                if self.process.poll() is None:
+                    self.process.kill()
+                self.process.wait()
+                self.process.stdout.close()
+
+            if self.path:
+                # End of file is the normal end of a replay
+                self.running = False
+            elif self.running:
+                self._restart_gap()
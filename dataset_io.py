@@ -0,0 +1,101 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from schema import apply_schema
+
+# Every pipeline stage reads and writes Parquet; CSV copies are opt-in
+# (pass --csv to a script or set CIPHEREYE_EXPORT_CSV=1).
+EXPORT_CSV = "--csv" in sys.argv or os.environ.get("CIPHEREYE_EXPORT_CSV") == "1"
+
+
+def csv_path(path):
+    return os.path.splitext(path)[0] + ".csv"
+
+
+def parquet_path(path):
+    return os.path.splitext(path)[0] + ".parquet"
+
+
+def resolve(path):
+    """Return `path` if it exists, else its CSV twin (outputs of older pipeline runs)."""
+    if os.path.exists(path):
+        return path
+    legacy = csv_path(path)
+    if os.path.exists(legacy):
+        return legacy
+    return path
+
+
+def table_columns(path):
+    """Column names of a Parquet or CSV table without reading its rows."""
+    path = resolve(path)
+    if path.endswith(".csv"):
+        return list(pd.read_csv(path, nrows=0).columns)
+    return pq.read_schema(path).names
+
+
+def read_table(path, columns=None):
+    """Read a Parquet file (or its legacy CSV twin), loading only the `columns`
+    that exist in it, cast to the compact schema."""
+    path = resolve(path)
+    if columns is not None:
+        present = set(table_columns(path))
+        columns = [c for c in columns if c in present]
+    if path.endswith(".csv"):
+        return apply_schema(pd.read_csv(path, usecols=columns))
+    return apply_schema(pd.read_parquet(path, columns=columns))
+
+
+def iter_table_chunks(path, chunk_rows=250_000, columns=None):
+    """Yield DataFrame chunks of a Parquet file (or legacy CSV) without loading it
+    whole, each cast to the compact schema."""
+    path = resolve(path)
+    if path.endswith(".csv"):
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_rows):
+            yield apply_schema(chunk)
+        return
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+        yield apply_schema(batch.to_pandas())
+
+
+def table_rows(path):
+    """Row count from Parquet metadata (no data read); CSVs are counted by lines."""
+    path = resolve(path)
+    if path.endswith(".csv"):
+        with open(path, "rb") as f:
+            return max(sum(1 for _ in f) - 1, 0)
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def normalize_labels(labels):
+    """Benign -> 0, any attack -> 1 (vectorized; accepts strings or 0/1)."""
+    text = labels.astype(str).str.strip().str.lower()
+    return (~text.isin(["benign", "0"])).astype(np.int8)
+
+
+def write_table(df, path, export_csv=None):
+    """Write `df` as Parquet, plus a CSV copy when CSV export is enabled."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, path, compression="zstd")
+    if EXPORT_CSV if export_csv is None else export_csv:
+        df.to_csv(csv_path(path), index=False)
+    return path
+
+
+def list_tables(directory):
+    """Parquet files in `directory`, plus CSVs that have no Parquet twin yet."""
+    names = sorted(os.listdir(directory))
+    parquet = [f for f in names if f.endswith(".parquet")]
+    stems = {os.path.splitext(f)[0] for f in parquet}
+    legacy = [f for f in names if f.endswith(".csv") and os.path.splitext(f)[0] not in stems]
+    return parquet + legacy
+
+
+def table_name(filename):
+    """Output name for an input table: same stem, Parquet extension."""
+    return parquet_path(filename)
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Keys kept in RAM before sorted runs are spilled to disk (8 bytes each)
+MAX_KEYS_IN_MEMORY = 64_000_000
+
+
+def row_hashes(df):
+    """64-bit hash of every row's values, computed column-wise by pandas."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+class GlobalDeduplicator:
+    """Drop rows already seen anywhere in the corpus, in bounded memory.
+
+    Each row is reduced to a 64-bit hash. Seen hashes are kept as a few
+    sorted runs (merged LSM-style so there are only O(log n) of them) and
+    looked up with binary search. Once the in-memory runs hold more than
+    `max_keys` hashes, the largest run is written to a .npy file and
+    memory-mapped, so lookups touch only the pages they need.
+
+    Rows are kept in the order they are offered: the first occurrence wins.
+    With 64-bit hashes the chance of a false duplicate is ~n^2 / 2^65.
+    """
+
+    def __init__(self, max_keys=MAX_KEYS_IN_MEMORY, spill_dir=None):
+        self.max_keys = max_keys
+        self.spill_dir = spill_dir
+        self._own_spill_dir = spill_dir is None
+        self.memory_runs = []
+        self.disk_runs = []
+        self.removed = {}
+        self.kept = {}
+
+    def __len__(self):
+        return sum(len(r) for r in self.memory_runs) + sum(len(r) for r in self.disk_runs)
+
+    def _seen(self, keys):
+        seen = np.zeros(len(keys), dtype=bool)
+        for run in self.disk_runs + self.memory_runs:
+            if len(run) == 0:
+                continue
+            pos = np.searchsorted(run, keys)
+            pos[pos == len(run)] = 0
+            seen |= run[pos] == keys
+        return seen
+
+    def _add_run(self, keys):
+        self.memory_runs.append(np.sort(keys))
+        # Merge while the newest run is at least half the size of the one before it
+        while len(self.memory_runs) > 1 and len(self.memory_runs[-2]) <= 2 * len(self.memory_runs[-1]):
+            newest = self.memory_runs.pop()
+            self.memory_runs[-1] = np.union1d(self.memory_runs[-1], newest)
+        if sum(len(r) for r in self.memory_runs) > self.max_keys:
+            self._spill()
+
+    def _spill(self):
+        biggest = max(range(len(self.memory_runs)), key=lambda i: len(self.memory_runs[i]))
+        run = self.memory_runs.pop(biggest)
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="cipheye_dedup_")
+        path = os.path.join(self.spill_dir, f"run_{len(self.disk_runs):04d}.npy")
+        np.save(path, run)
+        self.disk_runs.append(np.load(path, mmap_mode="r"))
+
+    def filter(self, df, source=None):
+        """Return the rows of `df` not seen before (in this chunk or earlier ones)."""
+        if df.empty:
+            return df
+        keys = row_hashes(df)
+        # First occurrence of each key within the chunk
+        _, first = np.unique(keys, return_index=True)
+        keep = np.zeros(len(keys), dtype=bool)
+        keep[first] = True
+        keep[first[self._seen(keys[first])]] = False
+
+        if keep.any():
+            self._add_run(keys[keep])
+        if source is not None:
+            self.removed[source] = self.removed.get(source, 0) + int((~keep).sum())
+            self.kept[source] = self.kept.get(source, 0) + int(keep.sum())
+        return df[keep] if not keep.all() else df
+
+    def close(self):
+        """Drop all seen hashes and delete spilled runs in a temporary directory."""
+        self.memory_runs = []
+        self.disk_runs = []
+        if self._own_spill_dir and self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+
+    def report(self):
+        """Print duplicates removed per source, in the order sources were seen."""
+        print("\n🔹 Global deduplication:")
+        for source, removed in self.removed.items():
+            total = removed + self.kept[source]
+            share = 100 * removed / total if total else 0.0
+            print(f"   {os.path.basename(str(source)):<60} {removed:>10} removed ({share:5.1f}%)")
+        print(f"   Unique rows kept: {sum(self.kept.values())}, duplicates removed: "
+              f"{sum(self.removed.values())}, hashes on disk: {sum(len(r) for r in self.disk_runs)}")
@@ -1,11 +1,27 @@
 import os
+import argparse
 import pandas as pd
 import numpy as np
 
+from dataset_io import list_tables, read_table, write_table, table_name
+from parallel import add_jobs_argument, ordered_map, resolve_jobs
+from profiling import add_profile_argument, start_profile, mark
+from schema import apply_schema, footprint, report_memory
+
 PROCESSED_DIR = "./processed/"
 FEATURES_DIR = "./features/"
 os.makedirs(FEATURES_DIR, exist_ok=True)
 
+# Source columns extract_features() can use; everything else is never read
+SOURCE_COLUMNS = [
+    "PacketLength",
+    "Packet Length Min", "Packet Length Max", "Packet Length Mean", "Packet Length Std",
+    "Flow Duration", "Flow IAT Mean", "Flow IAT Std",
+    "SYN Flag Count", "ACK Flag Count", "FIN Flag Count", "PSH Flag Count",
+    "Fwd Header Length", "Bwd Header Length",
+    "Label"
+]
+
 def extract_features(df):
     """
     Extract features for each row (flow) individually.
@@ -49,15 +65,43 @@ def extract_features(df):
     if "Label" in df.columns:
         features["label"] = df["Label"]
 
-    return features
+    # float32 measurements, uint16 flag counts, compact label
+    return apply_schema(features)
+
+def process_file(f):
+    """Worker: extract features for one processed file and save them.
+
+    Returns the output name and the frame's footprint; the parent logs
+    both, in file order.
+    """
+    df = read_table(os.path.join(PROCESSED_DIR, f), columns=SOURCE_COLUMNS)
+    features_df = extract_features(df)
+    out_name = table_name(f)
+    write_table(features_df, os.path.join(FEATURES_DIR, out_name))
+    return out_name, footprint(features_df)
 
-def process_all_files():
-    files = [f for f in os.listdir(PROCESSED_DIR) if f.endswith(".csv")]
-    for f in files:
-        df = pd.read_csv(os.path.join(PROCESSED_DIR, f))
-        features_df = extract_features(df)
-        features_df.to_csv(os.path.join(FEATURES_DIR, f), index=False)
-        print(f"✅ Features extracted and saved: {f}")
+def process_all_files(jobs=1, only=None):
+    files = list_tables(PROCESSED_DIR)
+    if only:
+        wanted = {os.path.basename(f) for f in only}
+        files = [f for f in files if f in wanted]
+    # With a pool a per-file stage would time the wait for the next result, and
+    # worker CPU only counts once the pool exits: profile the pool as one stage
+    parallel = min(resolve_jobs(jobs), len(files)) > 1
+    if files:
+        mark("extract features" if parallel else files[0])
+    # Logged in file order, whichever worker finishes first
+    for i, (out_name, size) in enumerate(ordered_map(process_file, files, jobs)):
+        print(f"✅ Features extracted and saved: {out_name}")
+        report_memory(out_name, size=size)
+        if not parallel and i + 1 < len(files):
+            mark(files[i + 1])
 
 if __name__ == "__main__":
-    process_all_files()
+    parser = add_jobs_argument(argparse.ArgumentParser(description="Map processed flows to model features"))
+    parser.add_argument("--only", nargs="+", metavar="FILE", help="Process only these processed files")
+    parser.add_argument("--csv", action="store_true", help="Also write CSV copies")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    start_profile("features")
+    process_all_files(args.jobs, args.only)
@@ -0,0 +1,238 @@
+import math
+from collections import OrderedDict, namedtuple
+
+# ----------------------------
+# Flow feature layout
+# ----------------------------
+# Same columns (and order) that features.py produces from the CSE-CIC-IDS2018
+# "Packet Length *", "Flow Duration", "Flow IAT *", "* Flag Count" and
+# "* Header Length" columns, so the live path feeds the model what it was trained on.
+FLOW_FEATURES = [
+    "pkt_size_min", "pkt_size_max", "pkt_size_mean", "pkt_size_std",
+    "flow_duration", "flow_iat_mean", "flow_iat_std",
+    "syn_flag_count", "ack_flag_count", "fin_flag_count", "psh_flag_count",
+    "fwd_header_length", "bwd_header_length"
+]
+
+# TCP flag bits
+FIN = 0x001
+SYN = 0x002
+RST = 0x004
+PSH = 0x008
+ACK = 0x010
+URG = 0x020
+
+# Defaults follow CICFlowMeter: flows end on FIN/RST or after 120s,
+# and are dropped from the table when they go quiet.
+IDLE_TIMEOUT = 15.0
+ACTIVE_TIMEOUT = 120.0
+MAX_FLOWS = 100_000
+
+# One decoded packet, as produced by the capture side.
+#   ts          capture timestamp (epoch seconds)
+#   length      frame length on the wire
+#   payload_len transport payload length (CICFlowMeter's "packet length")
+#   flags       TCP flag bits (0 for non-TCP)
+#   header_len  transport header length in bytes
+PacketMeta = namedtuple(
+    "PacketMeta",
+    ["ts", "src", "dst", "sport", "dport", "proto", "length", "payload_len", "flags", "header_len"]
+)
+
+
+class RunningStats:
+    """Streaming min/max/mean/std using Welford's update (O(1) per value)."""
+
+    __slots__ = ("n", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def update(self, x):
+        self.n += 1
+        if self.n == 1:
+            self.min = self.max = x
+        elif x < self.min:
+            self.min = x
+        elif x > self.max:
+            self.max = x
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def std(self):
+        # Sample standard deviation, as reported by CICFlowMeter
+        if self.n < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.n - 1))
+
+
+class Flow:
+    """Bidirectional flow state. The first packet seen decides the forward direction."""
+
+    __slots__ = (
+        "key", "src", "dst", "sport", "dport", "proto",
+        "start", "last_seen", "fwd_packets", "bwd_packets", "bytes",
+        "pkt_size", "iat", "syn", "ack", "fin", "psh", "rst", "urg",
+        "fwd_header_length", "bwd_header_length"
+    )
+
+    def __init__(self, key, pkt):
+        self.key = key
+        self.src = pkt.src
+        self.dst = pkt.dst
+        self.sport = pkt.sport
+        self.dport = pkt.dport
+        self.proto = pkt.proto
+        self.start = pkt.ts
+        self.last_seen = pkt.ts
+        self.fwd_packets = 0
+        self.bwd_packets = 0
+        self.bytes = 0
+        self.pkt_size = RunningStats()
+        self.iat = RunningStats()
+        self.syn = self.ack = self.fin = self.psh = self.rst = self.urg = 0
+        self.fwd_header_length = 0
+        self.bwd_header_length = 0
+
+    def is_forward(self, pkt):
+        return pkt.src == self.src and pkt.sport == self.sport
+
+    def update(self, pkt):
+        """Fold one packet into the flow statistics."""
+        if self.fwd_packets or self.bwd_packets:
+            # Inter-arrival times are reported in microseconds, like "Flow IAT Mean"
+            self.iat.update((pkt.ts - self.last_seen) * 1e6)
+        self.last_seen = pkt.ts
+        self.bytes += pkt.length
+        self.pkt_size.update(pkt.payload_len)
+
+        if self.is_forward(pkt):
+            self.fwd_packets += 1
+            self.fwd_header_length += pkt.header_len
+        else:
+            self.bwd_packets += 1
+            self.bwd_header_length += pkt.header_len
+
+        flags = pkt.flags
+        if flags:
+            self.syn += 1 if flags & SYN else 0
+            self.ack += 1 if flags & ACK else 0
+            self.fin += 1 if flags & FIN else 0
+            self.psh += 1 if flags & PSH else 0
+            self.rst += 1 if flags & RST else 0
+            self.urg += 1 if flags & URG else 0
+
+    @property
+    def packets(self):
+        return self.fwd_packets + self.bwd_packets
+
+    def features(self):
+        """Return the CICFlowMeter-style feature dict for this flow."""
+        return {
+            "pkt_size_min": self.pkt_size.min,
+            "pkt_size_max": self.pkt_size.max,
+            "pkt_size_mean": self.pkt_size.mean,
+            "pkt_size_std": self.pkt_size.std,
+            "flow_duration": (self.last_seen - self.start) * 1e6,
+            "flow_iat_mean": self.iat.mean,
+            "flow_iat_std": self.iat.std,
+            "syn_flag_count": self.syn,
+            "ack_flag_count": self.ack,
+            "fin_flag_count": self.fin,
+            "psh_flag_count": self.psh,
+            "fwd_header_length": self.fwd_header_length,
+            "bwd_header_length": self.bwd_header_length,
+            # Flow identity for display
+            "protocol": self.proto,
+            "src_ip": self.src,
+            "dst_ip": self.dst,
+            "src_port": self.sport,
+            "dst_port": self.dport,
+            "packets": self.packets,
+            "bytes": self.bytes,
+        }
+
+
+def flow_key(pkt):
+    """Direction-independent 5-tuple key, so both directions land in the same flow."""
+    a = (pkt.src, pkt.sport)
+    b = (pkt.dst, pkt.dport)
+    if a <= b:
+        return (pkt.proto, a, b)
+    return (pkt.proto, b, a)
+
+
+class FlowTable:
+    """Flow table keyed by 5-tuple with idle/active timeouts and a size cap.
+
+    `add()` returns the flows that finished because of that packet (FIN/RST,
+    active timeout, idle timeout or eviction), each as a feature dict, so
+    every flow is scored exactly once.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, active_timeout=ACTIVE_TIMEOUT, max_flows=MAX_FLOWS):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max_flows
+        # Ordered by last activity: the least recently seen flow is always first
+        self.flows = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.flows)
+
+    def add(self, pkt):
+        finished = []
+        key = flow_key(pkt)
+        flow = self.flows.get(key)
+
+        if flow is not None and pkt.ts - flow.start > self.active_timeout:
+            # Long-lived flow: report what we have and start a new one
+            del self.flows[key]
+            finished.append(flow.features())
+            flow = None
+
+        if flow is None:
+            flow = Flow(key, pkt)
+            self.flows[key] = flow
+        else:
+            self.flows.move_to_end(key)
+
+        flow.update(pkt)
+
+        if pkt.flags & (FIN | RST):
+            del self.flows[key]
+            finished.append(flow.features())
+
+        finished.extend(self.expire(pkt.ts))
+
+        while len(self.flows) > self.max_flows:
+            _, oldest = self.flows.popitem(last=False)
+            self.evicted += 1
+            finished.append(oldest.features())
+
+        return finished
+
+    def expire(self, now):
+        """Finish every flow idle for longer than `idle_timeout` as of `now`."""
+        finished = []
+        cutoff = now - self.idle_timeout
+        while self.flows:
+            key, flow = next(iter(self.flows.items()))
+            if flow.last_seen >= cutoff:
+                break
+            del self.flows[key]
+            finished.append(flow.features())
+        return finished
+
+    def flush(self):
+        """Finish and return every flow still in the table."""
+        finished = [flow.features() for flow in self.flows.values()]
+        self.flows.clear()
+        return finished
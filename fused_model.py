@@ -0,0 +1,210 @@
+import json
+import numpy as np
+
+# ---------------------------
+# Artifact paths
+# ---------------------------
+FUSED_BOOSTER_FILE = "./results/fused_model.ubj"
+FUSED_ARRAYS_FILE = "./results/fused_model.npz"
+
+
+def _parse_base_score(value):
+    # xgboost >= 3 stores it as a vector string such as "[5E-1]"
+    return float(str(value).strip("[]").split(",")[0])
+
+
+def fuse_booster_json(model_json, mean, scale):
+    """Rewrite split thresholds so the trees take raw (unscaled) features.
+
+    StandardScaler maps x to (x - mean) / scale with scale > 0, so the
+    split `(x - mean) / scale < t` is the same as `x < t * scale + mean`.
+    Leaf values are stored in the same array as thresholds and are left alone.
+    """
+    model_json = json.loads(json.dumps(model_json))
+    trees = model_json["learner"]["gradient_booster"]["model"]["trees"]
+    for tree in trees:
+        feature = np.asarray(tree["split_indices"], dtype=np.int64)
+        threshold = np.asarray(tree["split_conditions"], dtype=np.float64)
+        is_split = np.asarray(tree["left_children"]) != -1
+        f = feature[is_split]
+        raw = threshold.astype(np.float32)
+        raw[is_split] = raw_thresholds(threshold[is_split], mean[f], scale[f])
+        tree["split_conditions"] = raw.astype(float).tolist()
+    return model_json
+
+
+def raw_thresholds(t, mean, scale, max_steps=64):
+    """Smallest float32 raw values whose scaled value reaches each threshold.
+
+    `t * scale + mean` is only right up to rounding. Features that sit exactly
+    on a split (integer counts, quantile cut values) would then go the other
+    way, so the float32 result is nudged one ulp at a time until
+    x < raw  <=>  float32((x - mean) / scale) < t  holds exactly.
+    """
+    t32 = np.float32(t)
+
+    def scaled(x):
+        return ((x.astype(np.float64) - mean) / scale).astype(np.float32)
+
+    raw = np.float32(t * scale + mean)
+    for _ in range(max_steps):
+        down = scaled(raw) >= t32
+        if not down.any():
+            break
+        raw = np.where(down, np.nextafter(raw, np.float32(-np.inf)), raw)
+    for _ in range(max_steps):
+        up = scaled(raw) < t32
+        if not up.any():
+            break
+        raw = np.where(up, np.nextafter(raw, np.float32(np.inf)), raw)
+    return raw
+
+
+def fuse(model, scaler):
+    """Fold a fitted StandardScaler into an XGBClassifier and return a raw-input Booster."""
+    from xgboost import Booster
+
+    model_json = json.loads(model.get_booster().save_raw(raw_format="json"))
+    fused_json = fuse_booster_json(model_json, np.asarray(scaler.mean_), np.asarray(scaler.scale_))
+    booster = Booster()
+    booster.load_model(bytearray(json.dumps(fused_json).encode()))
+    return booster, fused_json
+
+
+def tree_arrays(model_json):
+    """Flatten every tree into shared node arrays for the NumPy evaluator."""
+    learner = model_json["learner"]
+    trees = learner["gradient_booster"]["model"]["trees"]
+    feature, threshold, left, right, default_left, roots = [], [], [], [], [], []
+    offset = 0
+    depth = 0
+    for tree in trees:
+        n = len(tree["left_children"])
+        lc = np.asarray(tree["left_children"], dtype=np.int64)
+        rc = np.asarray(tree["right_children"], dtype=np.int64)
+        is_leaf = lc == -1
+        node = np.arange(n, dtype=np.int64)
+        # Leaves point at themselves so rows that reach them stay put
+        left.append(np.where(is_leaf, node, lc) + offset)
+        right.append(np.where(is_leaf, node, rc) + offset)
+        feature.append(np.asarray(tree["split_indices"], dtype=np.int32))
+        threshold.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+        default_left.append(np.asarray(tree["default_left"], dtype=bool))
+        roots.append(offset)
+        offset += n
+
+        # xgboost numbers children after their parent, so one forward pass finds the depth
+        node_depth = np.zeros(n, dtype=np.int64)
+        for i in np.flatnonzero(~is_leaf):
+            node_depth[lc[i]] = node_depth[rc[i]] = node_depth[i] + 1
+        depth = max(depth, int(node_depth.max(initial=0)))
+    return {
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "default_left": np.concatenate(default_left),
+        "roots": np.asarray(roots, dtype=np.int64),
+        "base_score": np.float64(_parse_base_score(learner["learner_model_param"]["base_score"])),
+        "depth": np.int64(depth),
+    }
+
+
+def export_fused(model, scaler, booster_file=FUSED_BOOSTER_FILE, arrays_file=FUSED_ARRAYS_FILE):
+    """Write the fused predictor both as a native UBJ booster and as NumPy arrays."""
+    booster, fused_json = fuse(model, scaler)
+    booster.save_model(booster_file)
+    np.savez_compressed(arrays_file, **tree_arrays(fused_json))
+    return booster
+
+
+class FusedBoosterPredictor:
+    """Raw features in, probabilities out, through one xgboost call."""
+
+    def __init__(self, booster):
+        self.booster = booster
+
+    @classmethod
+    def load(cls, path=FUSED_BOOSTER_FILE):
+        from xgboost import Booster
+
+        booster = Booster()
+        booster.load_model(path)
+        return cls(booster)
+
+    def predict_proba(self, X):
+        p = self.booster.inplace_predict(np.asarray(X, dtype=np.float32))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(int)
+
+
+class NumpyTreePredictor:
+    """Batched tree evaluation in pure NumPy, for when importing xgboost is too heavy.
+
+    All rows walk all trees at once: each step gathers the split feature and
+    threshold for every (row, tree) pair and moves one level down. Rows that
+    reach a leaf stay there, so `depth` steps finish every tree.
+    """
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.default_left = arrays["default_left"]
+        self.roots = arrays["roots"]
+        self.depth = int(arrays["depth"])
+        # Leaf values live in the threshold array, as in the xgboost dump
+        base_score = float(arrays["base_score"])
+        self.base_margin = np.log(base_score / (1.0 - base_score))
+
+    @classmethod
+    def load(cls, path=FUSED_ARRAYS_FILE):
+        with np.load(path) as data:
+            return cls({k: data[k] for k in data.files})
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        n = X.shape[0]
+        rows = np.arange(n)[:, None]
+        node = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        for _ in range(self.depth):
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.threshold[node].sum(axis=1, dtype=np.float64) + self.base_margin
+
+    def predict_proba(self, X):
+        p = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(int)
+
+
+def verify_parity(model, scaler, X_raw, predictors, min_agreement=0.999, atol=1e-4):
+    """Check fused predictors against the original scaler + model two-step prediction.
+
+    Returns {name: (label agreement, max |prob diff|)} and raises if any
+    predictor disagrees on more than (1 - min_agreement) of the rows.
+    """
+    X_raw = np.asarray(X_raw, dtype=np.float64)
+    reference = model.predict_proba(scaler.transform(X_raw))[:, 1]
+    # The live buffer is float32, so that is what the fused predictors see
+    X_live = X_raw.astype(np.float32)
+    results = {}
+    for name, predictor in predictors.items():
+        proba = predictor.predict_proba(X_live)[:, 1]
+        agreement = float(np.mean((proba >= 0.5) == (reference >= 0.5)))
+        max_diff = float(np.max(np.abs(proba - reference))) if len(proba) else 0.0
+        results[name] = (agreement, max_diff)
+        print(f"   {name:<8} label agreement={agreement:.5f}  max |Δp|={max_diff:.2e}")
+        if agreement < min_agreement:
+            raise AssertionError(f"{name} fused predictor disagrees with scaler+model on "
+                                 f"{1 - agreement:.4%} of rows")
+        if max_diff > atol and agreement < 1.0:
+            print(f"   ⚠️ {name}: probabilities differ by up to {max_diff:.2e} "
+                  f"(float32 rounding of fused thresholds)")
+    return results
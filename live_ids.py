@@ -187,30 +187,137 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"⚠️ Error: {e}")
 '''
-import pyshark
-import pandas as pd
-import joblib
 import time
 import psutil
 import asyncio
 import subprocess
-from pyshark.tshark.tshark import get_all_tshark_interfaces_names
+import os
+import threading
+from flows import FlowTable, PacketMeta
+from inference import BatchPredictor
+from fused_model import FusedBoosterPredictor, NumpyTreePredictor, FUSED_BOOSTER_FILE, FUSED_ARRAYS_FILE
+from capture import CaptureSession, TsharkFieldsSession
+from rawcapture import RawCaptureSession
+from metrics import metrics
+import profiling
+
+# "pyshark" dissects with tshark; "fields" reads tshark -T fields output in chunks;
+# "raw" decodes headers from an AF_PACKET socket (Linux)
+CAPTURE_BACKEND = os.environ.get("CIPHEREYE_CAPTURE_BACKEND", "pyshark")
+
+# "fused" = scaler folded into the xgboost trees, "numpy" = fused trees evaluated
+# without xgboost, "sklearn" = scaler.pkl + xgboost_model.pkl; "auto" prefers fused
+PREDICTOR = os.environ.get("CIPHEREYE_PREDICTOR", "auto")
+
+MODEL_FILE = "./results/xgboost_model.pkl"
+MODEL_UBJ_FILE = "./results/xgboost_model.ubj"
+SCALER_FILE = "./results/scaler.pkl"
+
+# How long interface/tshark discovery results are reused before a background refresh (seconds)
+DISCOVERY_TTL = 60.0
+
+# Loaded on first use by load_model(), not at import
+model = None
+scaler = None
+predictor = None
+_model_lock = threading.Lock()
+
+def load_model():
+    """Load the model and scaler once, warm them up, and return the shared BatchPredictor."""
+    global model, scaler, predictor
+    if predictor is not None:
+        return predictor
+    with _model_lock:
+        if predictor is not None:
+            return predictor
+        try:
+            print("Loading model and scaler...")
+            start = time.perf_counter()
+            if PREDICTOR == "numpy":
+                loaded, loaded_scaler = NumpyTreePredictor.load(FUSED_ARRAYS_FILE), None
+            elif PREDICTOR == "fused" or (PREDICTOR == "auto" and os.path.exists(FUSED_BOOSTER_FILE)):
+                loaded, loaded_scaler = FusedBoosterPredictor.load(FUSED_BOOSTER_FILE), None
+            else:
+                import joblib
+                if os.path.exists(MODEL_UBJ_FILE):
+                    from xgboost import XGBClassifier
+                    loaded = XGBClassifier()
+                    loaded.load_model(MODEL_UBJ_FILE)
+                else:
+                    loaded = joblib.load(MODEL_FILE)
+                loaded_scaler = joblib.load(SCALER_FILE)
+
+            # Scores finished flows in micro-batches; `predict_one` is the per-row fallback
+            batch_predictor = BatchPredictor(loaded, loaded_scaler)
+            warm_up(batch_predictor)
+            model, scaler = loaded, loaded_scaler
+            predictor = batch_predictor
+            print(f"Model and scaler loaded successfully ({type(model).__name__}, "
+                  f"{time.perf_counter() - start:.2f}s including warm-up)")
+        except Exception as e:
+            print(f"Error loading model or scaler: {str(e)}")
+            raise
+    return predictor
+
+def warm_up(batch_predictor):
+    """Run one throwaway prediction so the first real verdict does not pay for lazy init."""
+    batch_predictor.add({})
+    batch_predictor.flush()
+    batch_predictor.batches = 0
+    batch_predictor.scale_time = batch_predictor.predict_time = 0.0
+
+class TTLCache:
+    """Cache one function result for `ttl` seconds and refresh it in the background.
+
+    The first call computes synchronously. After that, a stale value is
+    still returned immediately while a background thread recomputes it, so
+    callers on the request path never wait on subprocesses.
+    """
+
+    def __init__(self, func, ttl=DISCOVERY_TTL):
+        self.func = func
+        self.ttl = ttl
+        self.value = None
+        self.error = None
+        self.updated = None
+        self.refreshing = False
+        self.lock = threading.Lock()
 
-# Load the model and scaler
-try:
-    print("Loading model and scaler...")
-    model = joblib.load("./results/xgboost_model.pkl")
-    scaler = joblib.load("./results/scaler.pkl")
-    print("Model and scaler loaded successfully")
-except Exception as e:
-    print(f"Error loading model or scaler: {str(e)}")
-    raise
+    def refresh(self):
+        try:
+            value, error = self.func(), None
+        except Exception as e:
+            value, error = None, e
+        with self.lock:
+            if error is None or self.updated is None:
+                self.value, self.error = value, error
+            self.updated = time.monotonic()
+            self.refreshing = False
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def get(self):
+        if self.updated is None:
+            self.refresh()
+        elif time.monotonic() - self.updated > self.ttl:
+            self.refresh_in_background()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def __call__(self):
+        return self.get()
 
 def str_to_int_flag(flag):
     """Convert 'True'/'False' strings from PyShark TCP flags to 1/0."""
     return 1 if flag == "True" else 0
 
-def check_tshark_installation():
+def _check_tshark_installation():
     """Check if TShark is properly installed and accessible."""
     import subprocess
     import os
@@ -240,7 +347,7 @@ def check_tshark_installation():
     except Exception as e:
         raise RuntimeError(f"Error checking TShark installation: {e}")
 
-def get_active_interface():
+def _find_active_interface():
     """Return the best available network interface for packet capture."""
     try:
         # First check if TShark is properly installed
@@ -293,101 +400,115 @@ def get_active_interface():
     except Exception as e:
         raise RuntimeError(f"Error finding active interface: {str(e)}")
 
+# Discovery runs subprocesses, so results are cached and refreshed in the background
+check_tshark_installation = TTLCache(_check_tshark_installation)
+get_active_interface = TTLCache(_find_active_interface)
+
+def _layer_int(layer, name, default=0):
+    """Read an integer field from a pyshark layer, accepting hex strings."""
+    value = getattr(layer, name, default)
+    if isinstance(value, str):
+        return int(value, 16) if value.startswith("0x") else int(value)
+    return int(value)
+
 def extract_features(packet):
-    """Extract relevant features from a packet for ML prediction."""
+    """Decode the fields the flow table needs from a pyshark packet.
+
+    Returns a `PacketMeta`, or None for packets without an IP/TCP/UDP header.
+    Flow-level features are computed by `FlowTable` once the flow finishes.
+    """
+    t0 = time.perf_counter()
     try:
-        # Get basic packet info
-        length = int(getattr(packet, "length", 0))
-        timestamp = float(getattr(packet, "sniff_timestamp", 0.0))
-        
-        # Initialize TCP flags
-        tcp_flags = {
-            "syn": 0,
-            "ack": 0,
-            "fin": 0,
-            "psh": 0,
-            "rst": 0,
-            "urg": 0
-        }
-        
-        # Extract TCP information if available
+        return _decode_packet(packet)
+    finally:
+        metrics.observe("parse", time.perf_counter() - t0)
+
+def _decode_packet(packet):
+    try:
+        if hasattr(packet, "ip"):
+            ip = packet.ip
+        elif hasattr(packet, "ipv6"):
+            ip = packet.ipv6
+        else:
+            return None
+
         if hasattr(packet, "tcp"):
-            tcp = packet.tcp
+            l4 = packet.tcp
+            proto = "TCP"
             try:
-                # Get TCP flags from the flags field
-                flags = getattr(tcp, "flags", "0x000")
-                if isinstance(flags, str):
-                    flags = int(flags, 16)
-                else:
-                    flags = int(flags)
-                
-                # Extract individual flags
-                tcp_flags["syn"] = 1 if flags & 0x002 else 0  # SYN flag
-                tcp_flags["ack"] = 1 if flags & 0x010 else 0  # ACK flag
-                tcp_flags["fin"] = 1 if flags & 0x001 else 0  # FIN flag
-                tcp_flags["psh"] = 1 if flags & 0x008 else 0  # PSH flag
-                tcp_flags["rst"] = 1 if flags & 0x004 else 0  # RST flag
-                tcp_flags["urg"] = 1 if flags & 0x020 else 0  # URG flag
+                flags = _layer_int(l4, "flags")
             except Exception as e:
                 print(f"Error parsing TCP flags: {e}")
-            
-            # Get header length
-            header_length = int(getattr(tcp, "len", 0))
+                flags = 0
+            header_len = _layer_int(l4, "hdr_len", 20)
+            payload_len = _layer_int(l4, "len")
+        elif hasattr(packet, "udp"):
+            l4 = packet.udp
+            proto = "UDP"
+            flags = 0
+            header_len = 8
+            payload_len = max(_layer_int(l4, "length", 8) - 8, 0)
         else:
-            header_length = 0
-
-        # Create feature dictionary
-        features = {
-            # Packet size features
-            "pkt_size_min": length,
-            "pkt_size_max": length,
-            "pkt_size_mean": length,
-            "pkt_size_std": 0,  # Single packet, so std dev is 0
-            
-            # Flow timing features
-            "flow_duration": timestamp,
-            "flow_iat_mean": 0,  # Inter-arrival time needs multiple packets
-            "flow_iat_std": 0,   # Standard deviation needs multiple packets
-            
-            # TCP flag counts
-            "syn_flag_count": tcp_flags["syn"],
-            "ack_flag_count": tcp_flags["ack"],
-            "fin_flag_count": tcp_flags["fin"],
-            "psh_flag_count": tcp_flags["psh"],
-            
-            # Header lengths
-            "fwd_header_length": header_length,
-            "bwd_header_length": header_length
-        }
-        
-        # Add protocol information
-        features["protocol"] = getattr(packet, "highest_layer", "UNKNOWN")
-        
-        # Add IP information if available
-        if hasattr(packet, "ip"):
-            features["src_ip"] = packet.ip.src
-            features["dst_ip"] = packet.ip.dst
-        
-        print(f"Extracted features for packet: {features}")
-        return features
-        
+            return None
+
+        return PacketMeta(
+            ts=float(getattr(packet, "sniff_timestamp", 0.0)),
+            src=ip.src,
+            dst=ip.dst,
+            sport=_layer_int(l4, "srcport"),
+            dport=_layer_int(l4, "dstport"),
+            proto=proto,
+            length=int(getattr(packet, "length", 0)),
+            payload_len=payload_len,
+            flags=flags,
+            header_len=header_len,
+        )
+
     except Exception as e:
         print(f"Feature extraction error: {str(e)}")
         print(f"Packet summary: {packet.summary() if hasattr(packet, 'summary') else 'No summary available'}")
         return None
 
-def capture_packets(interface, packet_count=50):
-    """Capture and process network packets."""
+def classify_flow(features):
+    """Score one finished flow immediately and add its label in place."""
+    return load_model().predict_one(features)
+
+def report_flows(scored, flows_data):
+    """Append labelled flows to `flows_data`."""
+    for features in scored:
+        flows_data.append(features)
+        print(f"Processed flow: {features['src_ip']}:{features['src_port']} -> "
+              f"{features['dst_ip']}:{features['dst_port']} "
+              f"packets={features['packets']}, label={features['label']}")
+
+def classify_flows(finished, flows_data):
+    """Queue finished flows for batched scoring and collect any flushed batch."""
+    predictor = load_model()
+    for features in finished:
+        report_flows(predictor.add(features), flows_data)
+    report_flows(predictor.poll(), flows_data)
+
+# Flow state survives across capture_packets() calls so flows can span batches
+flow_table = FlowTable()
+
+def capture_packets(interface, packet_count=50, table=None):
+    """Capture packets, track them as flows and classify every flow that finishes.
+
+    Each returned dict is one finished flow (not one packet), labelled once.
+    """
     cap = None
     loop = None
+    table = flow_table if table is None else table
+    packets_data = []
     try:
         # Verify TShark installation first
         tshark_path = check_tshark_installation()
         print(f"Using TShark at: {tshark_path}")
         
-        packets_data = []
         print(f"Starting capture on interface: {interface}")
         
+        import pyshark
+
         # Create a new event loop for this thread
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
@@ -410,50 +531,16 @@ def capture_packets(interface, packet_count=50):
         # Use sniff_continuously to get packets in real-time
         for packet in cap.sniff_continuously(packet_count=packet_count):
             try:
-                features = extract_features(packet)
-                if features:
-                    # Make sure we have all required features
-                    required_features = [
-                        "pkt_size_min", "pkt_size_max", "pkt_size_mean", "pkt_size_std",
-                        "flow_duration", "flow_iat_mean", "flow_iat_std",
-                        "syn_flag_count", "ack_flag_count", "fin_flag_count", "psh_flag_count",
-                        "fwd_header_length", "bwd_header_length"
-                    ]
-                    
-                    # Create DataFrame with all required features
-                    df = pd.DataFrame([features])
-                    
-                    # Ensure all required features exist
-                    for feature in required_features:
-                        if feature not in df.columns:
-                            df[feature] = 0
-                    
-                    # Reorder columns to match training data
-                    df = df[required_features]
-                    
-                    # Scale features
-                    try:
-                        X_scaled = scaler.transform(df)
-                        
-                        # Make prediction
-                        pred = model.predict(X_scaled)[0]
-                        features["label"] = "Benign" if pred == 0 else "Malicious"
-                        
-                        # Add packet info for display
-                        features["time"] = time.strftime("%H:%M:%S")
-                        packets_data.append(features)
-                        
-                        print(f"Processed packet: size={features['pkt_size_mean']}, "
-                              f"label={features['label']}")
-                              
-                    except Exception as e:
-                        print(f"Error in prediction: {str(e)}")
-                        continue
-                        
+                pkt = extract_features(packet)
+                if pkt:
+                    classify_flows(table.add(pkt), packets_data)
             except Exception as e:
                 print(f"Error processing packet: {str(e)}")
                 continue
 
+        # Finish flows that went idle while we were waiting for packets
+        classify_flows(table.expire(time.time()), packets_data)
+        report_flows(load_model().flush(), packets_data)
         return packets_data
 
     except KeyboardInterrupt:
@@ -481,37 +568,71 @@ def capture_packets(interface, packet_count=50):
             except:
                 pass
 
+def open_session(interface, backend=None):
+    """Start a long-lived capture session yielding decoded packets."""
+    backend = backend or CAPTURE_BACKEND
+    if backend == "raw":
+        print(f"Using raw AF_PACKET capture on: {interface}")
+        return RawCaptureSession(interface).start()
+    if backend not in ("pyshark", "fields"):
+        raise ValueError(f"Unknown capture backend: {backend}")
+
+    tshark_path = check_tshark_installation()
+    print(f"Using TShark at: {tshark_path}")
+    if backend == "fields":
+        return TsharkFieldsSession(interface, tshark_path=tshark_path).start()
+    session = CaptureSession(interface, tshark_path=tshark_path, parse=extract_features)
+    return session.start()
+
+def stream_flows(session, table=None):
+    """Run the session's packets through the flow table and predictor.
+
+    Yields lists of labelled flows as they finish; returns when the session stops.
+    """
+    table = flow_table if table is None else table
+    for pkt in session.packets():
+        flows_data = []
+        try:
+            classify_flows(table.add(pkt), flows_data)
+        except Exception as e:
+            print(f"Error processing packet: {str(e)}")
+        if flows_data:
+            yield flows_data
+
+    # Session stopped: score whatever is still pending
+    flows_data = []
+    classify_flows(table.flush(), flows_data)
+    report_flows(load_model().flush(), flows_data)
+    if flows_data:
+        yield flows_data
+
 if __name__ == "__main__":
+    # --profile: startup vs. capture-loop timings, plus the live stage histograms
+    profiling.start_profile("live_ids", "startup")
     try:
         # Get the active interface
         interface = get_active_interface()
         print(f"🔵 Selected active interface: {interface}")
         print("Press Ctrl+C to stop the capture...")
 
-        while True:
-            try:
-                # Capture and analyze packets
-                packets = capture_packets(interface=interface, packet_count=50)
-                
+        session = open_session(interface)
+        profiling.mark("capture loop")
+        try:
+            for packets in stream_flows(session):
                 # Count results
                 benign = sum(1 for p in packets if p["label"] == "Benign")
                 malicious = sum(1 for p in packets if p["label"] == "Malicious")
-                
+
                 # Print results
-                print(f"\n📊 Analysis of last {len(packets)} packets:")
-                print(f"✅ Benign packets: {benign}")
-                print(f"⚠️ Malicious packets: {malicious}")
-                
-                # Small delay before next capture
-                time.sleep(2)
-                
-            except KeyboardInterrupt:
-                print("\n🛑 Packet capture stopped by user")
-                break
-            except Exception as e:
-                print(f"⚠️ Error during capture: {str(e)}")
-                time.sleep(5)  # Wait before retrying
-                continue
+                print(f"\n📊 Analysis of last {len(packets)} flows:")
+                print(f"✅ Benign flows: {benign}")
+                print(f"⚠️ Malicious flows: {malicious}")
+        except KeyboardInterrupt:
+            print("\n🛑 Packet capture stopped by user")
+        finally:
+            session.stop()
+            print(f"Session stats: {session.stats()}")
+            profiling.finish({"live_stages": metrics.snapshot(), "session": session.stats()})
                 
     except Exception as e:
         print(f"❌ Fatal error: {str(e)}")
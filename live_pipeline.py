@@ -0,0 +1,312 @@
+import os
+import threading
+import time
+from collections import deque
+
+from flows import FlowTable
+from metrics import metrics
+
+# What a full queue does with new items:
+#   "drop_oldest" - evict the oldest queued item, keep the newest
+#   "sample"      - above SAMPLE_WATERMARK, admit 1 in SAMPLE_EVERY items, drop the rest
+#   "degrade"     - flows that do not fit in the inference queue wait in a deferred
+#                   backlog scored in large batches (cheaper per flow); only flows that
+#                   do not fit there either are published as "Unscored", so flow/byte
+#                   counts stay complete
+OVERLOAD_POLICY = os.environ.get("CIPHEREYE_OVERLOAD_POLICY", "drop_oldest")
+OVERLOAD_POLICIES = ("drop_oldest", "sample", "degrade")
+SAMPLE_EVERY = 10
+SAMPLE_WATERMARK = 0.75
+
+# Queue capacities: decoded packets, finished flows, labelled batches
+PACKET_QUEUE_SIZE = 20000
+FLOW_QUEUE_SIZE = 4096
+VERDICT_QUEUE_SIZE = 256
+# "degrade": overflow flows are scored this many per model call
+DEFERRED_BATCH_SIZE = 1024
+
+UNSCORED = "Unscored"
+_DONE = object()  # End-of-stream marker passed down the stages
+
+
+class BoundedQueue:
+    """Non-blocking-put queue with a fixed capacity and an overload policy.
+
+    Producers never wait: when the queue is full the policy decides what is
+    lost, and every loss is counted, so a stage falling behind shows up in
+    stats() instead of stalling the stage before it.
+    """
+
+    def __init__(self, name, maxsize, policy="drop_oldest", sample_every=SAMPLE_EVERY,
+                 watermark=SAMPLE_WATERMARK, overflow=None):
+        if policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload policy: {policy}")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.sample_every = sample_every
+        self.high = max(1, int(maxsize * watermark))
+        # Called with items that do not fit, for the "degrade" policy
+        self.overflow = overflow
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.put_count = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.degraded = 0
+        self.max_depth = 0
+        self._offered = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        """Queue `item`; returns False if the overload policy dropped or diverted it."""
+        with self.cond:
+            depth = len(self.items)
+            if self.policy == "sample" and depth >= self.high:
+                self._offered += 1
+                if self._offered % self.sample_every:
+                    self.sampled_out += 1
+                    metrics.inc("dropped", queue=self.name, reason="sampled_out")
+                    return False
+            if depth >= self.maxsize:
+                if self.policy == "degrade" and self.overflow is not None:
+                    self.degraded += 1
+                    metrics.inc("degraded", queue=self.name)
+                    divert = True
+                else:
+                    self.items.popleft()
+                    self.dropped += 1
+                    metrics.inc("dropped", queue=self.name, reason="oldest")
+                    divert = False
+            else:
+                divert = False
+            if not divert:
+                self.items.append(item)
+                self.put_count += 1
+                self.max_depth = max(self.max_depth, len(self.items))
+                self.cond.notify()
+        if divert:
+            self.overflow(item)
+            return False
+        return True
+
+    def close(self):
+        """Queue the end-of-stream marker; never dropped."""
+        with self.cond:
+            self.items.append(_DONE)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Oldest item, or None if nothing arrived within `timeout`."""
+        with self.cond:
+            if not self.items and not self.cond.wait_for(lambda: self.items, timeout):
+                return None
+            return self.items.popleft()
+
+    def get_many(self, limit, timeout=None):
+        """Up to `limit` queued items (at least one unless the timeout passed)."""
+        with self.cond:
+            if not self.items and not self.cond.wait_for(lambda: self.items, timeout):
+                return []
+            n = min(limit, len(self.items))
+            return [self.items.popleft() for _ in range(n)]
+
+    def stats(self):
+        return {
+            "depth": len(self.items),
+            "max_depth": self.max_depth,
+            "capacity": self.maxsize,
+            "policy": self.policy,
+            "queued": self.put_count,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "degraded": self.degraded,
+        }
+
+
+class LivePipeline:
+    """capture -> flow -> inference -> publish, one thread per stage, bounded queues between.
+
+    The capture thread only decodes packets and queues them, so a slow model
+    or a slow client never stalls the socket. The flow thread runs the flow
+    table, the inference thread scores finished flows in batches of whatever
+    is queued, and flows() yields labelled batches to the publishing thread.
+    The flow table and predictor belong to this pipeline's threads: give each
+    pipeline its own (BatchPredictor.copy), and stop() one before the next starts.
+    """
+
+    def __init__(self, session, predictor, table=None, policy=OVERLOAD_POLICY,
+                 packet_queue=PACKET_QUEUE_SIZE, flow_queue=FLOW_QUEUE_SIZE,
+                 verdict_queue=VERDICT_QUEUE_SIZE, deferred_batch=DEFERRED_BATCH_SIZE):
+        self.session = session
+        self.predictor = predictor
+        self.table = FlowTable() if table is None else table
+        self.policy = policy
+        # Packets are sampled or dropped; degrading only makes sense once flows exist
+        packet_policy = "sample" if policy == "sample" else "drop_oldest"
+        self.packets = BoundedQueue("packets", packet_queue, packet_policy)
+        self.flows_q = BoundedQueue("flows", flow_queue, policy, overflow=self._defer)
+        self.verdicts = BoundedQueue("verdicts", verdict_queue, "drop_oldest")
+        # Overflow flows, scored by the inference thread in large batches between live ones
+        self.deferred = deque()
+        self.deferred_limit = flow_queue
+        self.deferred_predictor = predictor.copy(batch_size=deferred_batch, max_delay=float("inf"))
+        self.deferred_scored = 0
+        # Flows the deferred backlog had no room for wait here for the publisher, unscored
+        self.unscored = deque()
+        self.unscored_limit = flow_queue
+        self.unscored_dropped = 0
+        self.errors = 0
+        self.threads = []
+
+    def _defer(self, features):
+        if len(self.deferred) < self.deferred_limit:
+            self.deferred.append(features)
+        else:
+            self._unscored(features)
+
+    def _score_deferred(self):
+        """Score up to one large batch of deferred flows in a single model call."""
+        predictor = self.deferred_predictor
+        scored = []
+        for _ in range(min(len(self.deferred), predictor.batch_size)):
+            try:
+                scored.extend(predictor.add(self.deferred.popleft()))
+            except Exception as e:
+                self.errors += 1
+                metrics.inc("errors", stage="predict")
+                print(f"Error in deferred prediction: {str(e)}")
+        scored.extend(predictor.flush())
+        self.deferred_scored += len(scored)
+        return scored
+
+    def _unscored(self, features):
+        if len(self.unscored) >= self.unscored_limit:
+            # The queued ones are kept; this newest flow is the one lost
+            self.unscored_dropped += 1
+            metrics.inc("dropped", queue="unscored", reason="newest")
+            return
+        features["label"] = UNSCORED
+        features["time"] = time.strftime("%H:%M:%S")
+        self.unscored.append(features)
+
+    def _take_unscored(self):
+        taken = []
+        while self.unscored:
+            taken.append(self.unscored.popleft())
+        return taken
+
+    def start(self):
+        for name, target in (("capture", self._capture), ("flow", self._flow), ("inference", self._inference)):
+            thread = threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the session and wait for the stages to drain; True if they all finished."""
+        # The capture stage ends when the session does; the rest drain after it
+        self.session.stop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self.threads)
+
+    def _capture(self):
+        observe = metrics.histograms["capture"].record
+        captured = 0
+        try:
+            for pkt in self.session.packets():
+                # Capture latency: packet timestamp -> queued for the flow stage
+                now = time.time()
+                if 0 < pkt.ts <= now:
+                    observe(now - pkt.ts)
+                self.packets.put(pkt)
+                captured += 1
+                if captured == 1000:
+                    metrics.inc("packets", captured)
+                    captured = 0
+        except Exception as e:
+            self.errors += 1
+            metrics.inc("errors", stage="capture")
+            print(f"Capture stage error: {str(e)}")
+        finally:
+            metrics.inc("packets", captured)
+            self.packets.close()
+
+    def _flow(self):
+        observe = metrics.histograms["features"].record
+        perf_counter = time.perf_counter
+        while True:
+            pkt = self.packets.get()
+            if pkt is _DONE:
+                break
+            try:
+                t0 = perf_counter()
+                finished = self.table.add(pkt)
+                observe(perf_counter() - t0)
+                if finished:
+                    metrics.inc("flows", len(finished))
+                for features in finished:
+                    self.flows_q.put(features)
+            except Exception as e:
+                self.errors += 1
+                metrics.inc("errors", stage="features")
+                print(f"Error processing packet: {str(e)}")
+        finished = self.table.flush()
+        metrics.inc("flows", len(finished))
+        for features in finished:
+            self.flows_q.put(features)
+        self.flows_q.close()
+
+    def _inference(self):
+        predictor = self.predictor
+        done = False
+        while not done:
+            scored = []
+            # Take everything that is waiting: bigger batches when behind, cheaper per flow
+            for features in self.flows_q.get_many(predictor.batch_size, timeout=predictor.max_delay):
+                if features is _DONE:
+                    done = True
+                    break
+                try:
+                    scored.extend(predictor.add(features))
+                except Exception as e:
+                    self.errors += 1
+                    metrics.inc("errors", stage="predict")
+                    print(f"Error in prediction: {str(e)}")
+            scored.extend(predictor.flush() if done else predictor.poll())
+            # Deferred flows go in whole batches: once a batch is full, when the live
+            # queue is idle, and all of them at the end
+            if self.deferred and (done or not len(self.flows_q)
+                                  or len(self.deferred) >= self.deferred_predictor.batch_size):
+                scored.extend(self._score_deferred())
+                while done and self.deferred:
+                    scored.extend(self._score_deferred())
+            if scored:
+                self.verdicts.put(scored)
+        self.verdicts.close()
+
+    def flows(self):
+        """Yield lists of labelled flows until the session stops and the stages drain."""
+        while True:
+            batch = self.verdicts.get(timeout=0.1)
+            done = batch is _DONE
+            batch = ([] if done or batch is None else batch) + self._take_unscored()
+            if batch:
+                yield batch
+            if done:
+                return
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "errors": self.errors,
+            "deferred_pending": len(self.deferred),
+            "deferred_scored": self.deferred_scored,
+            "unscored_pending": len(self.unscored),
+            "unscored_dropped": self.unscored_dropped,
+            "queues": {q.name: q.stats() for q in (self.packets, self.flows_q, self.verdicts)},
+        }
@@ -1,27 +1,31 @@
 import pandas as pd
 import os
 
+from dataset_io import list_tables, read_table, write_table
+from schema import concat_frames, report_memory
+
 FEATURES_DIR = "./features/"
 OUTPUT_DIR = "./merged_features/"
-OUTPUT_FILE = os.path.join(OUTPUT_DIR, "merged_features.csv")
+OUTPUT_FILE = os.path.join(OUTPUT_DIR, "merged_features.parquet")
 
 # Create output directory if it doesn't exist
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-# List all CSV files in features folder
-files = [f for f in os.listdir(FEATURES_DIR) if f.endswith(".csv")]
+# List all feature tables in features folder
+files = list_tables(FEATURES_DIR)
 
 dfs = []
 for f in files:
-    df = pd.read_csv(os.path.join(FEATURES_DIR, f))
+    df = read_table(os.path.join(FEATURES_DIR, f))
     dfs.append(df)
 
 # Concatenate all dataframes
-merged_df = pd.concat(dfs, ignore_index=True)
+merged_df = concat_frames(dfs)
+report_memory("merged features", merged_df)
 
-# Save merged CSV
-merged_df.to_csv(OUTPUT_FILE, index=False)
+# Save merged Parquet (CSV only with --csv)
+write_table(merged_df, OUTPUT_FILE)
 print(f"Merged dataset saved to {OUTPUT_FILE}")
 
 # Show count of each label
@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import defaultdict
+
+# Live-path stages timed with observe(); "verdict" is queued-for-scoring -> labelled per flow
+STAGES = ["capture", "parse", "features", "scale", "predict", "verdict", "emit"]
+QUANTILES = [0.5, 0.95, 0.99]
+PREFIX = "ciphereye"
+
+# HDR-style buckets over integer microseconds: exact below SUB_BUCKETS, then
+# HALF linear sub-buckets per power of two (about 6% relative error), up to ~1 hour
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+HALF = SUB_BUCKETS // 2
+MAX_SHIFT = 27
+NUM_BUCKETS = SUB_BUCKETS + MAX_SHIFT * HALF
+
+# Cost of one timed observation (two perf_counter calls + observe) must stay under this
+OBSERVE_BUDGET = 2e-6
+
+
+def bucket_index(us):
+    if us < SUB_BUCKETS:
+        return us if us > 0 else 0
+    shift = us.bit_length() - SUB_BITS
+    if shift > MAX_SHIFT:
+        return NUM_BUCKETS - 1
+    return SUB_BUCKETS + (shift - 1) * HALF + (us >> shift) - HALF
+
+
+def bucket_value(i):
+    """Midpoint of bucket `i`, in microseconds."""
+    if i < SUB_BUCKETS:
+        return float(i)
+    shift = (i - SUB_BUCKETS) // HALF + 1
+    mantissa = (i - SUB_BUCKETS) % HALF + HALF
+    return ((mantissa << shift) + ((mantissa + 1) << shift)) / 2
+
+
+class Histogram:
+    """Fixed-memory log-linear latency histogram (HDR-histogram layout).
+
+    record() is an int conversion, a bit_length and a list increment, so it
+    is cheap enough for the per-packet path. Each stage is written by one
+    thread, so the counts are not locked.
+    """
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        self.counts[bucket_index(int(seconds * 1e6))] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self, qs=QUANTILES):
+        """Seconds at each quantile in `qs` (0.0 when empty)."""
+        counts = list(self.counts)
+        n = sum(counts)
+        result = []
+        seen = 0
+        i = 0
+        for q in sorted(qs):
+            rank = q * n
+            while i < len(counts) - 1 and seen + counts[i] < rank:
+                seen += counts[i]
+                i += 1
+            result.append(bucket_value(i) / 1e6 if n else 0.0)
+        return result
+
+
+class Metrics:
+    """Per-stage latency histograms and labelled counters, rendered for Prometheus."""
+
+    def __init__(self, stages=STAGES):
+        self.histograms = {stage: Histogram() for stage in stages}
+        self.counters = defaultdict(int)
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        self.histograms[stage].record(seconds)
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += n
+
+    def snapshot(self):
+        """Stage -> {count, sum, p50, p95, p99} in seconds, for logs and JSON."""
+        snap = {}
+        for stage, hist in self.histograms.items():
+            p50, p95, p99 = hist.quantiles()
+            snap[stage] = {"count": hist.count, "sum": hist.total, "p50": p50, "p95": p95, "p99": p99}
+        return snap
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        name = f"{PREFIX}_stage_latency_seconds"
+        lines = [f"# HELP {name} Live-path latency per stage.", f"# TYPE {name} summary"]
+        for stage, hist in self.histograms.items():
+            for q, value in zip(QUANTILES, hist.quantiles()):
+                lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {value:.9g}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {hist.total:.9g}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {hist.count}')
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+        declared = set()
+        for (counter, labels), value in counters:
+            metric = f"{PREFIX}_{counter}_total"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+
+        cost = overhead()
+        observations = sum(h.count for h in self.histograms.values())
+        uptime = max(time.time() - self.started, 1e-9)
+        lines += [
+            f"# HELP {PREFIX}_instrumentation_seconds_per_observation Measured cost of one timed observation.",
+            f"# TYPE {PREFIX}_instrumentation_seconds_per_observation gauge",
+            f"{PREFIX}_instrumentation_seconds_per_observation {cost:.9g}",
+            f"# HELP {PREFIX}_instrumentation_overhead_ratio Estimated share of wall time spent timing.",
+            f"# TYPE {PREFIX}_instrumentation_overhead_ratio gauge",
+            f"{PREFIX}_instrumentation_overhead_ratio {observations * cost / uptime:.9g}",
+            f"# TYPE {PREFIX}_uptime_seconds gauge",
+            f"{PREFIX}_uptime_seconds {uptime:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+_overhead = None
+
+
+def measure_overhead(n=200_000):
+    """Seconds per timed observation: two perf_counter() calls plus observe()."""
+    scratch = Metrics(["bench"])
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    for _ in range(n):
+        t0 = perf_counter()
+        scratch.observe("bench", perf_counter() - t0)
+    return (perf_counter() - start) / n
+
+
+def overhead():
+    """measure_overhead(), measured once per process."""
+    global _overhead
+    if _overhead is None:
+        _overhead = measure_overhead()
+        if _overhead > OBSERVE_BUDGET:
+            print(f"⚠️ Instrumentation costs {_overhead * 1e9:.0f} ns per observation "
+                  f"(budget {OBSERVE_BUDGET * 1e9:.0f} ns)")
+    return _overhead
+
+
+# Shared by the live path (live_ids, live_pipeline, inference, app)
+metrics = Metrics()
+
+
+if __name__ == "__main__":
+    cost = measure_overhead()
+    print(f"⏱️ {cost * 1e9:.0f} ns per timed observation (budget {OBSERVE_BUDGET * 1e9:.0f} ns)")
+    hist = Histogram()
+    for us in range(1, 100_001):
+        hist.record(us / 1e6)
+    p50, p95, p99 = hist.quantiles()
+    print(f"📊 1..100000 us: p50={p50 * 1e6:.0f} us, p95={p95 * 1e6:.0f} us, p99={p99 * 1e6:.0f} us")
+    raise SystemExit(0 if cost <= OBSERVE_BUDGET else 1)
@@ -0,0 +1,38 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def add_jobs_argument(parser):
+    """Add the shared --jobs option to a script's argument parser."""
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Worker processes (0 = one per CPU core, default 1)")
+    return parser
+
+
+def resolve_jobs(jobs):
+    if jobs is None or jobs == 1:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def ordered_map(func, items, jobs=1, tasks_per_child=4):
+    """Map `func` over `items`, in a process pool when jobs > 1.
+
+    Results are yielded in input order whatever order workers finish in, so
+    anything the caller prints is deterministic. Workers are recycled after
+    about `tasks_per_child` tasks to keep their memory bounded: each group
+    of jobs * tasks_per_child items gets a fresh pool. (The executor's own
+    max_tasks_per_child can hang on Python 3.11 once a worker retires.)
+    """
+    items = list(items)
+    jobs = min(resolve_jobs(jobs), max(len(items), 1))
+    if jobs == 1:
+        for item in items:
+            yield func(item)
+        return
+    group = jobs * tasks_per_child if tasks_per_child else len(items)
+    for start in range(0, len(items), group):
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            yield from pool.map(func, items[start:start + group])
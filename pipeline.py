@@ -0,0 +1,316 @@
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+
+from train_cache import ARRAYS as TRAIN_CACHE_ARRAYS
+
+# ---------------------------
+# Paths
+# ---------------------------
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = "./results/pipeline_state.json"
+
+RAW_DIR = "./data/"
+PROC_DIR = "./processed/"
+FEATURES_DIR = "./features/"
+
+
+class Stage:
+    """One script in the DAG.
+
+    A whole stage reads the outputs of the stages in `after` and writes
+    `outputs`. A per-file stage maps every file of its input directory to a
+    file of the same name in `out_dir` and is rerun with `--only` for just
+    the stale files. `chained` per-file stages (global deduplication) also
+    depend on every earlier file, so a changed day invalidates later days.
+    """
+
+    def __init__(self, name, script, after=(), outputs=(), args=(),
+                 in_dir=None, out_dir=None, chained=False):
+        self.name = name
+        self.script = script
+        self.after = tuple(after)
+        self.outputs = list(outputs)
+        self.args = list(args)
+        self.in_dir = in_dir
+        self.out_dir = out_dir
+        self.chained = chained
+
+    @property
+    def per_file(self):
+        return self.out_dir is not None
+
+
+def default_stages(target=200_000, seed=42):
+    return [
+        Stage("preprocess", "preprocess.py", in_dir=RAW_DIR, out_dir=PROC_DIR, chained=True),
+        Stage("features", "features.py", after=["preprocess"], in_dir=PROC_DIR, out_dir=FEATURES_DIR),
+        Stage("merge", "merge_feature.py", after=["features"],
+              outputs=["./merged_features/merged_features.parquet"]),
+        Stage("balance", "balance_dataset.py", after=["merge"],
+              args=["--target", str(target), "--seed", str(seed)],
+              outputs=["./balanced_dataset/balanced_dataset.parquet"]),
+        Stage("split", "split_dataset.py", after=["balance"],
+              outputs=["./train_dataset/train.parquet", "./test_dataset/test.parquet"]
+                      + [f"./train_cache/{name}.npy" for name in TRAIN_CACHE_ARRAYS]
+                      + ["./train_cache/scaler.pkl", "./train_cache/meta.json"]),
+        Stage("train_xgboost", "train_xgboost.py", after=["split"],
+              outputs=["./results/xgboost_model.pkl", "./results/xgboost_model.ubj",
+                       "./results/scaler.pkl", "./results/fused_model.ubj", "./results/fused_model.npz"]),
+        # Writes its own copy; `train_xgboost_full.py --promote` (not a stage) makes it the live model
+        Stage("train_xgboost_full", "train_xgboost_full.py", after=["features"],
+              outputs=["./results/full/xgboost_model.pkl", "./results/full/xgboost_model.ubj",
+                       "./results/full/scaler.pkl", "./results/full/fused_model.ubj",
+                       "./results/full/fused_model.npz"]),
+        Stage("train_model", "train_model.py", after=["split"],
+              outputs=["./dashboard_csvfiles/model_results.csv"]),
+    ]
+
+
+# ---------------------------
+# Fingerprints
+# ---------------------------
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class FileHashes:
+    """Content hashes of files, recomputed only when size or mtime changes."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __call__(self, path):
+        path = os.path.normpath(path)
+        if not os.path.exists(path):
+            return None
+        st = os.stat(path)
+        cached = self.cache.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        self.cache[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+
+def local_imports(script):
+    """The script plus every module of this repo it imports, recursively."""
+    seen = []
+    todo = [os.path.join(HERE, script)]
+    while todo:
+        path = todo.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.append(path)
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            todo.extend(os.path.join(HERE, n.split(".")[0] + ".py") for n in names)
+    return sorted(seen)
+
+
+def code_fingerprint(script, file_hash):
+    return sha256(json.dumps({os.path.basename(p): file_hash(p) for p in local_imports(script)},
+                             sort_keys=True).encode())
+
+
+def fingerprint(code, args, inputs):
+    return sha256(json.dumps({"code": code, "args": args, "inputs": inputs}, sort_keys=True).encode())
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+def load_state(path=STATE_FILE):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"files": {}, "units": {}}
+
+
+def save_state(state, path=STATE_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def with_ancestors(stages, targets):
+    """Stage names needed for `targets`, in dependency order."""
+    by_name = {s.name: s for s in stages}
+    order = []
+
+    def visit(name):
+        if name not in by_name:
+            raise SystemExit(f"⚠️ Unknown stage: {name} (have {', '.join(by_name)})")
+        if name in order:
+            return
+        for dep in by_name[name].after:
+            visit(dep)
+        order.append(name)
+
+    for t in targets:
+        visit(t)
+    return [by_name[n] for n in order]
+
+
+class Runner:
+    """Run stages whose fingerprint (code + args + input contents) changed
+    or whose outputs are missing or were modified since they were written."""
+
+    def __init__(self, stages, state_file=STATE_FILE, jobs=1, extra_args=(), force=(), dry_run=False):
+        self.stages = {s.name: s for s in stages}
+        self.state_file = state_file
+        self.state = load_state(state_file)
+        self.file_hash = FileHashes(self.state["files"])
+        self.jobs = jobs
+        self.extra_args = list(extra_args)
+        self.force = set(force)
+        self.dry_run = dry_run
+        self.produced = {}  # stage name -> output paths
+        self.dirty = set()  # stages that ran (or would, in a dry run)
+        self.summary = []
+
+    def valid(self, stage, key, fp):
+        if stage.name in self.force:
+            return False
+        # In a dry run upstream outputs are not rewritten, so staleness is inherited
+        if self.dry_run and any(dep in self.dirty for dep in stage.after):
+            return False
+        unit = self.state["units"].get(key)
+        if not unit or unit["fingerprint"] != fp:
+            return False
+        return all(self.file_hash(p) == h for p, h in unit["outputs"].items())
+
+    def record(self, key, fp, outputs):
+        self.state["units"][key] = {"fingerprint": fp,
+                                    "outputs": {p: self.file_hash(p) for p in outputs}}
+
+    def run_script(self, stage, only=None):
+        cmd = [sys.executable, os.path.join(HERE, stage.script)] + stage.args
+        if stage.per_file:
+            cmd += ["--jobs", str(self.jobs)]
+        cmd += self.extra_args
+        if only:
+            cmd += ["--only"] + only
+        print(f"\n▶️ {stage.name}: {' '.join([stage.script] + cmd[2:])}")
+        env = dict(os.environ, MPLBACKEND="Agg")
+        result = subprocess.run(cmd, env=env)
+        if result.returncode != 0:
+            raise SystemExit(f"⚠️ {stage.name} failed with exit code {result.returncode}")
+
+    def input_files(self, stage):
+        if stage.after:
+            return [p for dep in stage.after for p in self.produced[dep]]
+        return [os.path.join(stage.in_dir, f) for f in sorted(os.listdir(stage.in_dir))
+                if f.endswith(".parquet")]
+
+    def prune(self, stage, keys):
+        """Remove outputs of per-file units whose input no longer exists."""
+        prefix = stage.name + ":"
+        for key in [k for k in self.state["units"] if k.startswith(prefix) and k not in keys]:
+            unit = self.state["units"][key] if self.dry_run else self.state["units"].pop(key)
+            for path in unit["outputs"]:
+                if self.dry_run:
+                    print(f"🗑️ {stage.name}: would remove {path} (input gone)")
+                    continue
+                if os.path.exists(path):
+                    os.remove(path)
+                print(f"🗑️ {stage.name}: removed {path} (input gone)")
+
+    def run_per_file(self, stage, code):
+        inputs = self.input_files(stage)
+        chain = ""
+        plan = []
+        for path in inputs:
+            in_hash = self.file_hash(path)
+            # Chained stages depend on every earlier file too
+            chain = sha256((chain + in_hash).encode()) if stage.chained else in_hash
+            name = os.path.basename(path)
+            out = os.path.join(stage.out_dir, name.replace(" ", "_"))
+            key = f"{stage.name}:{name}"
+            fp = fingerprint(code, stage.args, {name: chain})
+            stale = not self.valid(stage, key, fp)
+            plan.append((key, fp, name, out, stale))
+        self.prune(stage, {k for k, *_ in plan})
+        self.produced[stage.name] = [out for *_, out, _ in plan]
+
+        stale = [p for p in plan if p[4]]
+        if stale:
+            self.dirty.add(stage.name)
+        if stale and not self.dry_run:
+            self.run_script(stage, only=[name for _, _, name, _, _ in stale])
+            for key, fp, _, out, _ in stale:
+                self.record(key, fp, [out])
+        return len(stale), len(plan)
+
+    def run_whole(self, stage, code):
+        inputs = {os.path.normpath(p): self.file_hash(p) for p in self.input_files(stage)}
+        fp = fingerprint(code, stage.args + self.extra_args, inputs)
+        self.produced[stage.name] = stage.outputs
+        if self.valid(stage, stage.name, fp):
+            return 0, 1
+        self.dirty.add(stage.name)
+        if not self.dry_run:
+            self.run_script(stage)
+            self.record(stage.name, fp, [p for p in stage.outputs if os.path.exists(p)])
+        return 1, 1
+
+    def run(self, order):
+        total_start = time.perf_counter()
+        for stage in order:
+            start = time.perf_counter()
+            code = code_fingerprint(stage.script, self.file_hash)
+            if stage.per_file:
+                ran, units = self.run_per_file(stage, code)
+            else:
+                ran, units = self.run_whole(stage, code)
+            self.summary.append((stage.name, ran, units, time.perf_counter() - start))
+            if not self.dry_run:
+                save_state(self.state, self.state_file)
+        self.print_summary(time.perf_counter() - total_start)
+
+    def print_summary(self, elapsed):
+        verb = "would run" if self.dry_run else "ran"
+        print(f"\n📊 Pipeline summary")
+        print(f"   {'stage':<16}{'status':<24}{'time (s)':>10}")
+        for name, ran, units, seconds in self.summary:
+            if ran == 0:
+                status = "cached"
+            elif units > 1 or self.stages[name].per_file:
+                status = f"{verb} {ran}/{units} files"
+            else:
+                status = verb
+            print(f"   {name:<16}{status:<24}{seconds:>10.1f}")
+        print(f"   {'total':<16}{'':<24}{elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rerun only the pipeline stages whose inputs, code or parameters changed")
+    parser.add_argument("targets", nargs="*", default=["train_xgboost"],
+                        help="Stages to bring up to date, with everything they depend on (default: train_xgboost)")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Worker processes for per-file stages")
+    parser.add_argument("--target", type=int, default=200_000, help="Rows per class kept by balance")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="Rerun these stages regardless")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would run")
+    parser.add_argument("--csv", action="store_true", help="Also write CSV copies")
+    args = parser.parse_args()
+
+    stages = default_stages(args.target, args.seed)
+    runner = Runner(stages, jobs=args.jobs, extra_args=["--csv"] if args.csv else [],
+                    force=args.force, dry_run=args.dry_run)
+    runner.run(with_ancestors(stages, args.targets))
@@ -1,7 +1,15 @@
 # preprocess_parquet.py
 import os
+import argparse
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
+
+from dataset_io import write_table, iter_table_chunks
+from parallel import add_jobs_argument, ordered_map, resolve_jobs
+from profiling import add_profile_argument, start_profile, mark
+from dedup import GlobalDeduplicator
+from schema import apply_schema, raw_dtypes, concat_frames, drop_non_finite, report_memory
 
 RAW_DIR = "./data/"
 PROC_DIR = "./processed/"
@@ -22,46 +30,149 @@ FEATURE_COLUMNS = [
     'Label'
 ]
 
-def preprocess_dataset(file_path, save=True):
-    # Read Parquet file
-    df = pd.read_parquet(file_path)
+LABEL_COLUMNS = ["Label", "Category", "FlowLabel"]
+
+def projected_columns(schema_names):
+    """Feature columns present in the file plus the first label column found."""
+    label_col = next((c for c in LABEL_COLUMNS if c in schema_names), None)
+    columns = [c for c in FEATURE_COLUMNS if c != "Label" and c in schema_names]
+    return columns, label_col
 
-    # Drop duplicates and NA
-    df = df.drop_duplicates().dropna()
+# Files with more row groups than this are split into chunks across workers
+CHUNK_ROW_GROUPS = 8
+
+def read_projected(file_path, row_groups=None):
+    """Read only the wanted columns, one row group at a time."""
+    pf = pq.ParquetFile(file_path)
+    columns, label_col = projected_columns(pf.schema_arrow.names)
+    wanted = columns + ([label_col] if label_col else [])
+    if row_groups is None:
+        row_groups = range(pf.num_row_groups)
+    frames = [pf.read_row_group(i, columns=wanted).to_pandas() for i in row_groups]
+    if frames:
+        df = pd.concat(frames, ignore_index=True)
+    else:
+        df = pf.schema_arrow.empty_table().select(wanted).to_pandas()
+    return df, columns, label_col
 
-    # Convert numeric columns where possible
-    for col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="ignore")
+def clean_chunk(task):
+    """Worker: read and clean one (file, row groups) chunk. Returns (df, label_col, rows read)."""
+    file_path, row_groups = task
+    # Read only FEATURE_COLUMNS from the Parquet file
+    df, numeric_cols, label_col = read_projected(file_path, row_groups)
+    rows_read = len(df)
 
-    # Detect label column
-    label_col = None
-    for col_name in ["Label", "Category", "FlowLabel"]:
-        if col_name in df.columns:
-            label_col = col_name
-            break
+    # Drop NA and inf before casting, so they cannot become made-up counts;
+    # duplicates are dropped across all files in finish_dataset()
+    df = drop_non_finite(df)
+
+    # Parquet columns are already typed; cast to the compact schema
+    # (float32 measurements, unsigned integer counts)
+    df = apply_schema(df, raw_dtypes(numeric_cols))
 
     if label_col:
         df[label_col] = df[label_col].replace({"BENIGN": 0, "ATTACK": 1})
         df.rename(columns={label_col: "Label"}, inplace=True)
-    else:
+        df = apply_schema(df, {})
+    return df, label_col, rows_read
+
+def plan_chunks(file_path, chunk_row_groups=None):
+    """Split a file into row-group ranges; None = the whole file as one chunk."""
+    if not chunk_row_groups:
+        return [(file_path, None)]
+    n = pq.ParquetFile(file_path).num_row_groups
+    if n <= chunk_row_groups:
+        return [(file_path, None)]
+    return [(file_path, list(range(i, min(i + chunk_row_groups, n))))
+            for i in range(0, n, chunk_row_groups)]
+
+def finish_dataset(file_path, results, dedup, save=True):
+    """Combine cleaned chunks of one file, drop rows seen in any earlier file, and save."""
+    frames = [df for df, _, _ in results]
+    df = concat_frames(frames)
+    rows_clean = len(df)
+    df = dedup.filter(df, source=file_path)
+    if not results[0][1]:
         print(f"⚠️ No label column found in {file_path}")
-    
-    # Keep only wanted columns if they exist
-    keep_cols = [col for col in FEATURE_COLUMNS if col in df.columns]
-    df = df[keep_cols]
 
-    # Save processed CSV
+    # Save processed Parquet (CSV only with --csv)
     if save:
-        fname = os.path.basename(file_path).replace(" ", "_").replace(".parquet", ".csv")
-        out_path = os.path.join(PROC_DIR, fname)
-        df.to_csv(out_path, index=False)
-        print(f"✅ Saved processed dataset: {out_path}")
+        out_path = output_path(file_path)
+        write_table(df, out_path)
+        rows_read = sum(r for _, _, r in results)
+        print(f"✅ Saved processed dataset: {out_path} ({rows_read} read, "
+              f"{rows_clean - len(df)} duplicates, {len(df)} kept, "
+              f"{len(results)} chunk{'s' if len(results) != 1 else ''})")
+        report_memory(os.path.basename(out_path), df)
 
     return df
 
+def preprocess_dataset(file_path, save=True, dedup=None):
+    dedup = GlobalDeduplicator() if dedup is None else dedup
+    return finish_dataset(file_path, [clean_chunk((file_path, None))], dedup, save=save)
+
+def output_path(file_path):
+    return os.path.join(PROC_DIR, os.path.basename(file_path).replace(" ", "_"))
+
+def preprocess_all(files, jobs=1, chunk_row_groups=CHUNK_ROW_GROUPS, seen_outputs=()):
+    """Preprocess files in a process pool, splitting large files by row group.
+
+    Chunks are processed in parallel but results are combined, deduplicated
+    and logged in file order, so output is the same whatever the number of
+    workers. A row that already appeared in an earlier file is dropped;
+    `seen_outputs` are processed files of earlier days that are not being
+    redone, whose rows count as already seen.
+    """
+    dedup = GlobalDeduplicator()
+    mark("seed deduplicator")
+    for path in seen_outputs:
+        for chunk in iter_table_chunks(path):
+            dedup.filter(chunk)
+    tasks = []
+    owners = []
+    for path in files:
+        chunks = plan_chunks(path, chunk_row_groups if jobs != 1 else None)
+        tasks.extend(chunks)
+        owners.extend([path] * len(chunks))
+
+    # With a pool, per-file stages would time the wait for results and miss
+    # worker CPU until the pool exits, so the pool is profiled as one stage
+    parallel = min(resolve_jobs(jobs), len(tasks)) > 1
+    pending = []
+    if files:
+        mark("clean files" if parallel else os.path.basename(files[0]))
+    for owner, result in zip(owners, ordered_map(clean_chunk, tasks, jobs)):
+        if pending and pending[0][0] != owner:
+            finish_dataset(pending[0][0], [r for _, r in pending], dedup)
+            pending = []
+            if not parallel:
+                mark(os.path.basename(owner))
+        pending.append((owner, result))
+    if pending:
+        finish_dataset(pending[0][0], [r for _, r in pending], dedup)
+    dedup.report()
+    dedup.close()
+
 if __name__ == "__main__":
-    files = [f for f in os.listdir(RAW_DIR) if f.endswith(".parquet")]
+    parser = add_jobs_argument(argparse.ArgumentParser(description="Clean raw Parquet day files"))
+    parser.add_argument("--chunk-row-groups", type=int, default=CHUNK_ROW_GROUPS,
+                        help="With --jobs, split files with more row groups than this")
+    parser.add_argument("--only", nargs="+", metavar="FILE",
+                        help="Redo only these raw files; outputs of earlier days seed the deduplicator")
+    parser.add_argument("--csv", action="store_true", help="Also write CSV copies")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    start_profile("preprocess")
+
+    files = sorted(f for f in os.listdir(RAW_DIR) if f.endswith(".parquet"))
     if not files:
         print("⚠️ No Parquet files found in ./data/")
-    for f in files:
-        preprocess_dataset(os.path.join(RAW_DIR, f))
+    selected = files
+    seen = []
+    if args.only:
+        wanted = {os.path.basename(f) for f in args.only}
+        selected = [f for f in files if f in wanted]
+        last = files.index(selected[-1]) if selected else -1
+        seen = [output_path(f) for f in files[:last] if f not in wanted]
+    preprocess_all([os.path.join(RAW_DIR, f) for f in selected], args.jobs, args.chunk_row_groups,
+                   seen_outputs=seen)
@@ -0,0 +1,225 @@
+import atexit
+import csv
+import json
+import os
+import sys
+import threading
+import time
+
+# Like --csv in dataset_io: any script can be run with --profile (or CIPHEREYE_PROFILE=1);
+# --profile-stacks also samples call stacks into flamegraph-compatible collapsed stacks
+PROFILE_STACKS = "--profile-stacks" in sys.argv or os.environ.get("CIPHEREYE_PROFILE") == "stacks"
+PROFILE = PROFILE_STACKS or "--profile" in sys.argv or os.environ.get("CIPHEREYE_PROFILE") == "1"
+
+PROFILE_DIR = "./results/profiles/"
+HISTORY_FILE = "history.csv"  # In the profile directory, one row per stage per run
+HISTORY_COLUMNS = ["run", "script", "stage", "wall_s", "cpu_s", "peak_rss_mb", "argv"]
+SAMPLE_INTERVAL = 0.01  # Seconds between memory (and stack) samples
+
+
+def add_profile_argument(parser):
+    """Declare the shared profiling flags so argparse accepts them."""
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Write per-stage wall/CPU time and peak memory to {PROFILE_DIR}")
+    parser.add_argument("--profile-stacks", action="store_true",
+                        help="Like --profile, plus sampled call stacks (collapsed-stack format)")
+    return parser
+
+
+def _rss_mb():
+    """Current resident memory: psutil if installed, else /proc/self/statm (Linux)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # No /proc (e.g. macOS): only the lifetime peak is available
+        from schema import peak_rss_mb
+        return peak_rss_mb() or 0.0
+
+
+def _cpu_seconds():
+    """User + system time of this process and of its finished child processes (pool workers)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profiler:
+    """Per-stage wall/CPU time and peak memory for one script run.
+
+    Stages run back to back: mark("name") ends the current stage and starts
+    the next, so linear scripts need one call per section and no
+    re-indenting. A sampler thread records RSS every SAMPLE_INTERVAL
+    (giving each stage its own peak) and, with stacks=True, the call stack
+    of every other thread, rooted at the current stage name.
+
+    finish() (also run at exit) writes <script>_<run>.json, the collapsed
+    stacks (<script>_<run>.folded, for flamegraph.pl or speedscope) and
+    appends one row per stage to history.csv, then prints the change
+    against the previous run of the same script.
+    """
+
+    def __init__(self, script, enabled=PROFILE, stacks=PROFILE_STACKS, out_dir=PROFILE_DIR,
+                 interval=SAMPLE_INTERVAL):
+        self.script = script
+        self.enabled = enabled
+        self.stacks = stacks
+        self.out_dir = out_dir
+        self.interval = interval
+        self.run = time.strftime("%Y%m%d-%H%M%S")
+        self.stages = []
+        self.folded = {}
+        self.extra = {}
+        self._current = None
+        self._stop = threading.Event()
+        self._finished = False
+        self._pid = os.getpid()  # Forked pool workers inherit the object but must not report
+        if enabled:
+            self._start_wall = time.perf_counter()
+            self._start_cpu = _cpu_seconds()
+            self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+            self._sampler.start()
+            atexit.register(self.finish)
+
+    def mark(self, stage):
+        """End the current stage (if any) and start `stage`."""
+        if not self.enabled or os.getpid() != self._pid:
+            return
+        self._end_stage()
+        rss = _rss_mb()
+        self._current = {"stage": stage, "wall": time.perf_counter(), "cpu": _cpu_seconds(), "peak": rss}
+
+    def _end_stage(self):
+        current, self._current = self._current, None
+        if current is None:
+            return
+        rss = _rss_mb()
+        self.stages.append({
+            "stage": current["stage"],
+            "wall_s": time.perf_counter() - current["wall"],
+            "cpu_s": _cpu_seconds() - current["cpu"],
+            "peak_rss_mb": max(current["peak"], rss),
+            "end_rss_mb": rss,
+        })
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            current = self._current
+            if current is None:
+                continue
+            rss = _rss_mb()
+            if rss > current["peak"]:
+                current["peak"] = rss
+            if self.stacks:
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    key = f"{current['stage']};{_collapse(frame)}"
+                    self.folded[key] = self.folded.get(key, 0) + 1
+
+    def finish(self, extra=None):
+        if not self.enabled or self._finished or os.getpid() != self._pid:
+            return
+        self._finished = True
+        self._end_stage()
+        self._stop.set()
+        self._sampler.join(timeout=1)
+        if extra:
+            self.extra.update(extra)
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"{self.script}_{self.run}")
+        report = {
+            "script": self.script,
+            "run": self.run,
+            "argv": sys.argv[1:],
+            "wall_s": time.perf_counter() - self._start_wall,
+            "cpu_s": _cpu_seconds() - self._start_cpu,
+            "peak_rss_mb": max([s["peak_rss_mb"] for s in self.stages] + [_rss_mb()]),
+            "stages": self.stages,
+        }
+        report.update(self.extra)
+        with open(base + ".json", "w") as f:
+            json.dump(report, f, indent=2)
+        if self.stacks:
+            with open(base + ".folded", "w") as f:
+                for stack, count in sorted(self.folded.items()):
+                    f.write(f"{stack} {count}\n")
+
+        previous = self._previous_run()
+        self._append_history(report)
+
+        print(f"\n⏱️ Profile of {self.script} ({report['wall_s']:.1f}s wall, {report['cpu_s']:.1f}s CPU, "
+              f"peak RSS {report['peak_rss_mb']:.0f} MB):")
+        for s in self.stages:
+            line = (f"   {s['stage']:<28} {s['wall_s']:9.2f}s wall {s['cpu_s']:9.2f}s CPU "
+                    f"{s['peak_rss_mb']:8.0f} MB")
+            before = previous.get(s["stage"])
+            if before and before["wall_s"] > 0:
+                line += f"   ({(s['wall_s'] / before['wall_s'] - 1) * 100:+.0f}% wall vs run {before['run']})"
+            print(line)
+        print(f"✅ Profile saved to {base}.json" + (f" and {base}.folded" if self.stacks else ""))
+
+    def _previous_run(self):
+        """Stage -> row of the latest earlier run of this script in history.csv."""
+        path = os.path.join(self.out_dir, HISTORY_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, newline="") as f:
+            rows = [r for r in csv.DictReader(f) if r["script"] == self.script and r["run"] != self.run]
+        if not rows:
+            return {}
+        last = rows[-1]["run"]
+        return {r["stage"]: {"run": last, "wall_s": float(r["wall_s"])} for r in rows if r["run"] == last}
+
+    def _append_history(self, report):
+        path = os.path.join(self.out_dir, HISTORY_FILE)
+        new = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(HISTORY_COLUMNS)
+            for s in self.stages:
+                writer.writerow([self.run, self.script, s["stage"], f"{s['wall_s']:.4f}", f"{s['cpu_s']:.4f}",
+                                 f"{s['peak_rss_mb']:.1f}", " ".join(report["argv"])])
+
+
+_active = None
+
+
+def start_profile(script, first_stage=None):
+    """Profiler for this run (a no-op unless --profile was given), optionally starting a stage."""
+    global _active
+    profiler = Profiler(script)
+    if profiler.enabled:
+        _active = profiler
+    if first_stage:
+        profiler.mark(first_stage)
+    return profiler
+
+
+def mark(stage):
+    """Start the next stage of the running profile; free when profiling is off."""
+    if _active is not None:
+        _active.mark(stage)
+
+
+def finish(extra=None):
+    """Write the running profile now instead of at exit, adding `extra` to its JSON."""
+    if _active is not None:
+        _active.finish(extra)
@@ -0,0 +1,313 @@
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+
+from flows import PacketMeta
+
+# ----------------------------
+# Header decoding
+# ----------------------------
+# Link-layer types (pcap LINKTYPE_*)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+ETH_P_VLAN = (0x8100, 0x88A8)
+ETH_P_ALL = 0x0003
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IP_OFFSET_MASK = 0x1FFF  # IPv4 fragment offset, in 8-byte units
+
+# Frames decode_frame() skipped because they were non-first IPv4 fragments
+decode_stats = {"fragments": 0}
+
+_u16 = struct.Struct("!H")
+_pcap_magic = struct.Struct("<I")
+
+
+def _network_offset(buf, linktype):
+    """Return (offset, ethertype) of the network header, or (None, None)."""
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 14
+        ethertype = _u16.unpack_from(buf, 12)[0]
+        while ethertype in ETH_P_VLAN:
+            ethertype = _u16.unpack_from(buf, offset + 2)[0]
+            offset += 4
+        return offset, ethertype
+    if linktype == LINKTYPE_LINUX_SLL:
+        return 16, _u16.unpack_from(buf, 14)[0]
+    if linktype == LINKTYPE_RAW:
+        version = buf[0] >> 4
+        return 0, ETH_P_IP if version == 4 else ETH_P_IPV6 if version == 6 else None
+    if linktype == LINKTYPE_NULL:
+        # Address family in host byte order; 2 is AF_INET everywhere
+        family = buf[0] or buf[3]
+        return 4, ETH_P_IP if family == 2 else ETH_P_IPV6
+    return None, None
+
+
+def decode_frame(buf, ts, length, linktype=LINKTYPE_ETHERNET, tcp_only=True):
+    """Decode Ethernet/IPv4/IPv6/TCP/UDP headers straight from the frame bytes.
+
+    `buf` is a bytes/memoryview of the captured frame and `length` its
+    original length on the wire. Returns the same `PacketMeta` as
+    `live_ids.extract_features`, or None for frames we do not track.
+    """
+    try:
+        offset, ethertype = _network_offset(buf, linktype)
+        if offset is None:
+            return None
+
+        if ethertype == ETH_P_IP:
+            if _u16.unpack_from(buf, offset + 6)[0] & IP_OFFSET_MASK:
+                # Later fragments carry payload, not a transport header. tshark
+                # reassembles them into the first one, so they are not packets of their own
+                decode_stats["fragments"] += 1
+                return None
+            ihl = (buf[offset] & 0x0F) * 4
+            ip_len = _u16.unpack_from(buf, offset + 2)[0]
+            proto = buf[offset + 9]
+            src = socket.inet_ntoa(buf[offset + 12:offset + 16])
+            dst = socket.inet_ntoa(buf[offset + 16:offset + 20])
+            l4 = offset + ihl
+            l4_len = ip_len - ihl
+        elif ethertype == ETH_P_IPV6:
+            # Extension headers are rare in practice; they are not walked here
+            l4_len = _u16.unpack_from(buf, offset + 4)[0]
+            proto = buf[offset + 6]
+            src = socket.inet_ntop(socket.AF_INET6, bytes(buf[offset + 8:offset + 24]))
+            dst = socket.inet_ntop(socket.AF_INET6, bytes(buf[offset + 24:offset + 40]))
+            l4 = offset + 40
+        else:
+            return None
+
+        if proto == IPPROTO_TCP:
+            header_len = (buf[l4 + 12] >> 4) * 4
+            flags = buf[l4 + 13] | ((buf[l4 + 12] & 0x01) << 8)
+            return PacketMeta(ts, src, dst,
+                              _u16.unpack_from(buf, l4)[0], _u16.unpack_from(buf, l4 + 2)[0],
+                              "TCP", length, max(l4_len - header_len, 0), flags, header_len)
+        if proto == IPPROTO_UDP and not tcp_only:
+            udp_len = _u16.unpack_from(buf, l4 + 4)[0]
+            return PacketMeta(ts, src, dst,
+                              _u16.unpack_from(buf, l4)[0], _u16.unpack_from(buf, l4 + 2)[0],
+                              "UDP", length, max(udp_len - 8, 0), 0, 8)
+        return None
+    except (IndexError, struct.error, OSError, ValueError):
+        # Truncated or malformed frame
+        return None
+
+
+# ----------------------------
+# pcap / pcapng readers
+# ----------------------------
+def read_pcap(path):
+    """Yield (timestamp, frame, orig_len, linktype) from a pcap or pcapng file.
+
+    The file is memory-mapped and frames are memoryview slices of the
+    mapping, so no per-packet copies are made. Each frame is released when
+    the next one is requested; copy it with bytes() to keep it. The mapping
+    is closed once the file is read.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data = memoryview(mapped)
+    record = None
+    try:
+        magic = _pcap_magic.unpack_from(data, 0)[0]
+        records = _read_pcapng(data) if magic == 0x0A0D0D0A else _read_classic(data, magic)
+        for record in records:
+            yield record
+            record[1].release()
+    finally:
+        if record is not None:
+            record[1].release()
+        data.release()
+        mapped.close()
+
+
+def _read_classic(data, magic):
+    if magic in (0xA1B2C3D4, 0xA1B23C4D):
+        endian = "<"
+    elif magic in (0xD4C3B2A1, 0x4D3CB2A1):
+        endian = ">"
+    else:
+        raise ValueError(f"Not a pcap file (magic {magic:#x})")
+    nanos = magic in (0xA1B23C4D, 0x4D3CB2A1)
+    divisor = 1e9 if nanos else 1e6
+
+    linktype = struct.unpack_from(endian + "I", data, 20)[0] & 0x0FFFFFFF
+    record = struct.Struct(endian + "IIII")
+    offset = 24
+    end = len(data)
+    while offset + 16 <= end:
+        sec, frac, incl_len, orig_len = record.unpack_from(data, offset)
+        offset += 16
+        yield sec + frac / divisor, data[offset:offset + incl_len], orig_len, linktype
+        offset += incl_len
+
+
+def _read_pcapng(data):
+    endian = "<"
+    interfaces = []  # (linktype, ticks per second) per interface id
+    offset = 0
+    end = len(data)
+    while offset + 12 <= end:
+        block_type = struct.unpack_from(endian + "I", data, offset)[0]
+        if block_type == 0x0A0D0D0A:
+            # Section header: byte-order magic decides the endianness of the section
+            bom = struct.unpack_from("<I", data, offset + 8)[0]
+            endian = "<" if bom == 0x1A2B3C4D else ">"
+            interfaces = []
+        block_len = struct.unpack_from(endian + "I", data, offset + 4)[0]
+        if block_len < 12:
+            break
+
+        if block_type == 1:
+            linktype = struct.unpack_from(endian + "H", data, offset + 8)[0]
+            interfaces.append([linktype, 1e6])
+            # Walk options looking for if_tsresol (code 9)
+            opt = offset + 16
+            while opt + 4 <= offset + block_len - 4:
+                code, opt_len = struct.unpack_from(endian + "HH", data, opt)
+                if code == 0:
+                    break
+                if code == 9 and opt_len >= 1:
+                    res = data[opt + 4]
+                    interfaces[-1][1] = float(2 ** (res & 0x7F)) if res & 0x80 else float(10 ** res)
+                opt += 4 + ((opt_len + 3) & ~3)
+        elif block_type == 6:
+            iface, ts_high, ts_low, incl_len, orig_len = struct.unpack_from(endian + "IIIII", data, offset + 8)
+            linktype, ticks = interfaces[iface] if iface < len(interfaces) else (LINKTYPE_ETHERNET, 1e6)
+            ts = ((ts_high << 32) | ts_low) / ticks
+            start = offset + 28
+            yield ts, data[start:start + incl_len], orig_len, linktype
+        elif block_type == 3:
+            # Simple packet block: no timestamp, original length only
+            orig_len = struct.unpack_from(endian + "I", data, offset + 8)[0]
+            linktype = interfaces[0][0] if interfaces else LINKTYPE_ETHERNET
+            incl_len = min(orig_len, block_len - 16)
+            yield 0.0, data[offset + 12:offset + 12 + incl_len], orig_len, linktype
+
+        offset += block_len
+
+
+def decode_record(record, tcp_only=True):
+    """Decode one (timestamp, frame, orig_len, linktype) record from `read_pcap`."""
+    ts, frame, orig_len, linktype = record
+    return decode_frame(frame, ts, orig_len, linktype, tcp_only)
+
+
+def iter_pcap_packets(path, tcp_only=True):
+    """Decoded `PacketMeta` for every tracked packet in a pcap/pcapng file."""
+    for ts, frame, orig_len, linktype in read_pcap(path):
+        pkt = decode_frame(frame, ts, orig_len, linktype, tcp_only)
+        if pkt is not None:
+            yield pkt
+
+
+# ----------------------------
+# Live AF_PACKET capture
+# ----------------------------
+class RawCaptureSession:
+    """Live capture from an AF_PACKET socket (Linux), decoded with `decode_frame`.
+
+    Same interface as `capture.CaptureSession` (start/packets/stop/stats),
+    without tshark, dissection or JSON in the loop.
+    """
+
+    def __init__(self, interface, tcp_only=True, snaplen=65535):
+        self.interface = interface
+        self.tcp_only = tcp_only
+        self.buffer = bytearray(snaplen)
+        self.sock = None
+        self.lock = threading.Lock()
+        self.reading = False  # A packets() loop owns the socket and closes it itself
+        self.running = False
+
+        self.started_at = None
+        self.stopped_at = None
+        self.packets_seen = 0
+        self.restarts = 0
+        self.gap_seconds = 0.0
+        self.estimated_lost = 0.0
+
+    def start(self):
+        self._close_socket()
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.ntohs(ETH_P_ALL))
+        try:
+            sock.bind((self.interface, 0))
+        except OSError:
+            sock.close()
+            raise
+        # Short timeout so stop() is noticed even when the link is quiet
+        sock.settimeout(0.5)
+        with self.lock:
+            self.sock = sock
+        self.running = True
+        self.started_at = time.time()
+        self.stopped_at = None
+        return self
+
+    def stop(self):
+        self.running = False
+        self.stopped_at = time.time()
+        # A reading loop sees `running` within the socket timeout and closes the socket
+        # itself; closing it here, under a blocked recv_into, is not safe
+        with self.lock:
+            idle = not self.reading
+        if idle:
+            self._close_socket()
+
+    def _close_socket(self):
+        with self.lock:
+            sock, self.sock = self.sock, None
+        if sock is not None:
+            sock.close()
+
+    def packets(self):
+        if not self.running:
+            self.start()
+        with self.lock:
+            sock = self.sock
+            self.reading = True
+        view = memoryview(self.buffer)
+        try:
+            while self.running and sock is not None:
+                try:
+                    n = sock.recv_into(self.buffer)
+                except socket.timeout:
+                    continue
+                self.packets_seen += 1
+                pkt = decode_frame(view[:n], time.time(), n, LINKTYPE_ETHERNET, self.tcp_only)
+                if pkt is not None:
+                    yield pkt
+        finally:
+            with self.lock:
+                self.reading = False
+            self._close_socket()
+
+    def stats(self):
+        if self.started_at is None:
+            uptime = 0.0
+        else:
+            uptime = (self.stopped_at or time.time()) - self.started_at
+        return {
+            "interface": self.interface,
+            "running": self.running,
+            "uptime": uptime,
+            "packets": self.packets_seen,
+            "restarts": self.restarts,
+            "gap_seconds": self.gap_seconds,
+            "estimated_lost": int(self.estimated_lost),
+            "fragments_skipped": decode_stats["fragments"],
+        }
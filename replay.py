@@ -0,0 +1,188 @@
+import argparse
+import json
+import time
+
+import live_ids
+from flows import FlowTable, FLOW_FEATURES
+from inference import BatchPredictor, BATCH_SIZE
+from capture import TsharkFieldsSession
+from rawcapture import read_pcap, decode_record
+from schema import peak_rss_mb, format_mb
+
+BACKENDS = ("pyshark", "fields", "raw")
+
+
+def iter_pcap(path, display_filter="tcp"):
+    """Yield pyshark packets from a pcap/pcapng file, dissected like the live capture."""
+    import pyshark
+
+    cap = pyshark.FileCapture(
+        path,
+        display_filter=display_filter,
+        include_raw=True,
+        use_json=True,
+        keep_packets=False
+    )
+    try:
+        for packet in cap:
+            yield packet
+    finally:
+        cap.close()
+
+
+def open_reader(path, backend):
+    """Return (records, parse) for a pcap file and capture backend."""
+    if backend == "raw":
+        return read_pcap(path), decode_record
+    if backend == "fields":
+        # tshark does the decoding, so parse time shows up under "read"
+        return TsharkFieldsSession(path=path).packets(), lambda pkt: pkt
+    return iter_pcap(path), live_ids.extract_features
+
+
+def replay(paths, speed=0.0, batch_size=None, backend="pyshark", keep_flows=False):
+    """Run pcap files through parse -> flow table -> scale -> predict.
+
+    speed=0 replays as fast as possible, speed=1 at the original packet
+    timestamps, speed=N at N times real time. Returns a report dict with
+    packets/sec, flows/sec and seconds spent in each stage.
+    """
+    table = FlowTable()
+    live_ids.load_model()
+    # Pacing uses packet time, so the deadline flush must not depend on wall clock
+    predictor = BatchPredictor(live_ids.model, live_ids.scaler,
+                               batch_size=batch_size or BATCH_SIZE, max_delay=float("inf"))
+
+    stages = {"read": 0.0, "parse": 0.0, "pacing": 0.0, "flow": 0.0, "batch": 0.0}
+    packets = 0
+    flows = []
+    first_ts = None
+    wall_start = None
+
+    start = time.perf_counter()
+    for path in paths:
+        print(f"▶️ Replaying {path}")
+        reader, parse = open_reader(path, backend)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                packet = next(reader)
+            except StopIteration:
+                break
+            t1 = time.perf_counter()
+            pkt = parse(packet)
+            t2 = time.perf_counter()
+            stages["read"] += t1 - t0
+            stages["parse"] += t2 - t1
+            packets += 1
+            if pkt is None:
+                continue
+
+            if speed > 0:
+                if first_ts is None:
+                    first_ts, wall_start = pkt.ts, t2
+                delay = wall_start + (pkt.ts - first_ts) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                t2_paced = time.perf_counter()
+                stages["pacing"] += t2_paced - t2
+                t2 = t2_paced
+
+            finished = table.add(pkt)
+            t3 = time.perf_counter()
+            stages["flow"] += t3 - t2
+            for features in finished:
+                flows.extend(predictor.add(features))
+            stages["batch"] += time.perf_counter() - t3
+
+    t3 = time.perf_counter()
+    for features in table.flush():
+        flows.extend(predictor.add(features))
+    flows.extend(predictor.flush())
+    elapsed = time.perf_counter() - start
+    stages["batch"] += elapsed - (t3 - start)
+
+    # "batch" is the buffering overhead only; the flush itself is split out below
+    stages["scale"] = predictor.scale_time
+    stages["predict"] = predictor.predict_time
+    stages["batch"] -= predictor.scale_time + predictor.predict_time
+    malicious = sum(1 for f in flows if f["label"] == "Malicious")
+    report = {
+        "files": list(paths),
+        "backend": backend,
+        "speed": speed,
+        "packets": packets,
+        "flows": len(flows),
+        "malicious_flows": malicious,
+        "elapsed": elapsed,
+        "packets_per_sec": packets / elapsed if elapsed else 0.0,
+        "flows_per_sec": len(flows) / elapsed if elapsed else 0.0,
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+        "batch_buffer_kb": predictor.buffer.nbytes / 1024,
+    }
+    if keep_flows:
+        report["flow_rows"] = flows
+    return report
+
+
+def compare_backends(paths, batch_size=None, tolerance=1e-6):
+    """Replay the same files with every backend and count flows whose features
+    differ from the pyshark reference."""
+    reports = {b: replay(paths, batch_size=batch_size, backend=b, keep_flows=True) for b in BACKENDS}
+
+    def keyed(rows):
+        return sorted(rows, key=lambda f: (str(f["src_ip"]), f["src_port"], str(f["dst_ip"]),
+                                           f["dst_port"], f["flow_duration"]))
+
+    reference = keyed(reports[BACKENDS[0]].pop("flow_rows"))
+    mismatched = 0
+    for name in BACKENDS[1:]:
+        other = keyed(reports[name].pop("flow_rows"))
+        mismatched += abs(len(reference) - len(other))
+        for fa, fb in zip(reference, other):
+            if any(abs(float(fa[n]) - float(fb[n])) > tolerance * max(1.0, abs(float(fa[n])))
+                   for n in FLOW_FEATURES):
+                mismatched += 1
+    return reports, mismatched
+
+
+def print_report(report):
+    print(f"\n📊 [{report['backend']}] Replayed {report['packets']} packets -> {report['flows']} flows "
+          f"({report['malicious_flows']} malicious) in {report['elapsed']:.2f}s")
+    print(f"   Packets/sec: {report['packets_per_sec']:.0f}")
+    print(f"   Flows/sec  : {report['flows_per_sec']:.0f}")
+    print("   Stage times:")
+    for stage, seconds in report["stages"].items():
+        share = 100 * seconds / report["elapsed"] if report["elapsed"] else 0.0
+        print(f"     {stage:<8} {seconds:8.3f}s  {share:5.1f}%")
+    print(f"   Memory: peak RSS {format_mb(report['peak_rss_mb'])}, "
+          f"batch buffer {report['batch_buffer_kb']:.1f} KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay pcap files through the live detection path")
+    parser.add_argument("pcaps", nargs="+", help="pcap/pcapng files, replayed in order")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="0 = as fast as possible, 1 = original timing, N = N x real time")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--backend", choices=BACKENDS, default="pyshark",
+                        help="pyshark = tshark dissection, fields = tshark -T fields, raw = struct header decoding")
+    parser.add_argument("--compare", action="store_true",
+                        help="Replay with every backend and check the flow features match")
+    parser.add_argument("--report", help="Also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    if args.compare:
+        reports, mismatched = compare_backends(args.pcaps, batch_size=args.batch_size)
+        for r in reports.values():
+            print_report(r)
+        print(f"\n{'✅' if mismatched == 0 else '⚠️'} Flows with differing features: {mismatched}")
+        report = {"backends": reports, "mismatched_flows": mismatched}
+    else:
+        report = replay(args.pcaps, speed=args.speed, batch_size=args.batch_size, backend=args.backend)
+        print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report saved to {args.report}")
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+
+class ClassReservoir:
+    """Uniform per-class sampling without replacement over a stream of chunks.
+
+    Every row gets a random key; each class keeps the `capacity` rows with
+    the smallest keys seen so far. That is exactly a uniform sample of the
+    stream, whatever the chunk sizes, and each chunk is handled with one
+    vectorized argpartition per class. Memory is capacity x classes rows.
+    """
+
+    def __init__(self, capacity, seed=42, label_col="label"):
+        self.capacity = capacity
+        self.label_col = label_col
+        self.rng = np.random.default_rng(seed)
+        self.samples = {}  # label -> DataFrame with a "_key" column
+        self.seen = {}
+
+    def keys(self, chunk):
+        return self.rng.random(len(chunk))
+
+    def update(self, chunk):
+        if chunk.empty:
+            return
+        chunk = chunk.assign(_key=self.keys(chunk))
+        for label, group in chunk.groupby(self.label_col, sort=False, observed=True):
+            self.seen[label] = self.seen.get(label, 0) + len(group)
+            current = self.samples.get(label)
+            merged = group if current is None else pd.concat([current, group], ignore_index=True)
+            self.samples[label] = self._smallest(merged, self.capacity)
+
+    @staticmethod
+    def _smallest(df, k):
+        if len(df) <= k:
+            return df
+        idx = np.argpartition(df["_key"].to_numpy(), k - 1)[:k]
+        return df.iloc[idx].reset_index(drop=True)
+
+    def result(self, balance=True, shuffle_seed=42):
+        """Concatenate the per-class samples.
+
+        With balance=True every class is cut to the size of the smallest
+        one (still uniform: the rows with the smallest keys are kept).
+        """
+        if not self.samples:
+            return pd.DataFrame()
+        size = min(len(s) for s in self.samples.values()) if balance else None
+        parts = [self._smallest(s, size) if size is not None else s
+                 for _, s in sorted(self.samples.items(), key=lambda kv: str(kv[0]))]
+        out = pd.concat(parts, ignore_index=True).drop(columns="_key")
+        return out.sample(frac=1, random_state=shuffle_seed).reset_index(drop=True)
+
+
+class WeightedClassReservoir(ClassReservoir):
+    """Weighted per-class sampling (Efraimidis-Spirakis) over a stream of chunks.
+
+    A row with weight w gets the key Exp(1) / w, and the smallest keys are
+    kept, so rows are drawn with probability proportional to their weight.
+    With weight = 1 / rows in the row's day file, every day contributes
+    about the same number of rows.
+    """
+
+    def __init__(self, capacity, weight_col="_weight", seed=42, label_col="label"):
+        super().__init__(capacity, seed=seed, label_col=label_col)
+        self.weight_col = weight_col
+
+    def keys(self, chunk):
+        return self.rng.exponential(size=len(chunk)) / chunk[self.weight_col].to_numpy()
+
+    def result(self, balance=True, shuffle_seed=42):
+        out = super().result(balance=balance, shuffle_seed=shuffle_seed)
+        return out.drop(columns=self.weight_col, errors="ignore")
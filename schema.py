@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+# ---------------------------
+# Declared dtypes
+# ---------------------------
+# Model features (features.extract_features offline, flows.FLOW_FEATURES live).
+# Continuous values are float32; flag counts are small non-negative integers.
+# Header lengths stay float32: CICFlowMeter emits negative values for some flows.
+FEATURE_DTYPES = {
+    "pkt_size_min": "float32",
+    "pkt_size_max": "float32",
+    "pkt_size_mean": "float32",
+    "pkt_size_std": "float32",
+    "flow_duration": "float32",
+    "flow_iat_mean": "float32",
+    "flow_iat_std": "float32",
+    "syn_flag_count": "uint16",
+    "ack_flag_count": "uint16",
+    "fin_flag_count": "uint16",
+    "psh_flag_count": "uint16",
+    "fwd_header_length": "float32",
+    "bwd_header_length": "float32",
+}
+
+# Raw CIC columns that are counts; every other raw numeric column is float32
+RAW_COUNT_DTYPES = {
+    "Total Fwd Packets": "uint32",
+    "Total Backward Packets": "uint32",
+    "SYN Flag Count": "uint16",
+    "ACK Flag Count": "uint16",
+    "FIN Flag Count": "uint16",
+    "PSH Flag Count": "uint16",
+}
+RAW_FLOAT_DTYPE = "float32"
+
+# Labels: text labels (Benign, DDoS, ...) are categorical; the 0/1 label is int8
+LABEL_COLUMNS = ("label", "Label")
+BINARY_LABEL_DTYPE = "int8"
+
+# What the models are fed (one matrix, so one dtype)
+MODEL_DTYPE = np.float32
+
+
+# ---------------------------
+# Casting
+# ---------------------------
+def cast_column(series, dtype):
+    """Cast one column; integer targets are rounded and clipped to their range.
+
+    NaN and inf have no integer value, so they raise instead of becoming
+    0 or the dtype's maximum: drop them first (drop_non_finite).
+    """
+    dtype = np.dtype(dtype)
+    if series.dtype == dtype:
+        return series
+    if dtype.kind in "iu":
+        info = np.iinfo(dtype)
+        values = series.to_numpy(dtype=np.float64)
+        if not np.isfinite(values).all():
+            raise ValueError(f"Column {series.name!r} has NaN or inf values, cannot cast to {dtype}")
+        values = np.clip(np.round(values), info.min, info.max)
+        return pd.Series(values.astype(dtype), index=series.index, name=series.name)
+    return series.astype(dtype)
+
+
+def drop_non_finite(df):
+    """Drop rows with NaN, or +/-inf in a numeric column (CIC rate columns have inf)."""
+    numeric = df.select_dtypes(include="number")
+    bad = df.isna().any(axis=1) | ~np.isfinite(numeric.to_numpy(dtype=np.float64)).all(axis=1)
+    return df[~bad] if bad.any() else df
+
+
+def compact_label(series):
+    """0/1 labels become int8, text labels categorical."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(BINARY_LABEL_DTYPE)
+    return series.astype("category")
+
+
+def apply_schema(df, dtypes=None):
+    """Cast the columns of `df` that the schema knows; others are left alone."""
+    dtypes = FEATURE_DTYPES if dtypes is None else dtypes
+    for col, dtype in dtypes.items():
+        if col in df.columns:
+            df[col] = cast_column(df[col], dtype)
+    for col in LABEL_COLUMNS:
+        if col in df.columns:
+            df[col] = compact_label(df[col])
+    return df
+
+
+def raw_dtypes(columns):
+    """Declared dtypes for raw CIC numeric columns."""
+    return {c: RAW_COUNT_DTYPES.get(c, RAW_FLOAT_DTYPE) for c in columns}
+
+
+def concat_frames(frames):
+    """pd.concat that keeps categorical columns categorical when categories differ."""
+    frames = [f for f in frames if f is not None]
+    if len(frames) == 1:
+        return frames[0]
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            union = pd.api.types.union_categoricals([f[col] for f in frames]).categories
+            frames = [f.assign(**{col: f[col].cat.set_categories(union)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def scale_for_model(scaler, X, fit=False):
+    """Scale in float64 like the live path does, then hand the model float32.
+
+    xgboost splits sit exactly on scaled training values, so training and
+    inference must round the same way: both scale in float64, and the
+    model sees float32 either way.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    X = scaler.fit_transform(X) if fit else scaler.transform(X)
+    return X.astype(MODEL_DTYPE)
+
+
+# ---------------------------
+# Memory reporting
+# ---------------------------
+def frame_mb(df):
+    return df.memory_usage(index=False, deep=True).sum() / 2**20
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None if it cannot be read."""
+    # Imported here: `resource` is Unix-only and this module is imported by the live path
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        # Windows keeps the peak working set; elsewhere only the current RSS is known
+        return getattr(info, "peak_wset", info.rss) / 2**20
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def format_mb(mb):
+    return "n/a" if mb is None else f"{mb:.0f} MB"
+
+
+def footprint(df):
+    """(rows, cols, MB) of a frame; small enough to return from a pool worker."""
+    return len(df), df.shape[1], frame_mb(df)
+
+
+def report_memory(stage, df=None, size=None):
+    """Print a frame's footprint (vs. the all-float64 equivalent) and peak RSS.
+
+    Pass `size` (from footprint()) instead of `df` to report a frame that
+    only existed in a worker.
+    """
+    if df is not None:
+        size = footprint(df)
+    if size is None:
+        print(f"📊 {stage}: peak RSS {format_mb(peak_rss_mb())}")
+        return
+    rows, cols, mb = size
+    wide = rows * cols * 8 / 2**20
+    print(f"📊 {stage}: {rows} rows x {cols} cols, {mb:.1f} MB "
+          f"(float64: {wide:.1f} MB), peak RSS {format_mb(peak_rss_mb())}")
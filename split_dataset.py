@@ -2,8 +2,16 @@ import pandas as pd
 import os
 from sklearn.model_selection import train_test_split
 
+from dataset_io import read_table, write_table
+from schema import report_memory
+from train_cache import write_cache
+from profiling import start_profile, mark
+
+# --profile writes per-stage timings to results/profiles/
+start_profile("split_dataset", "load")
+
 # Input balanced dataset
-INPUT_FILE = "./balanced_dataset/balanced_dataset.csv"
+INPUT_FILE = "./balanced_dataset/balanced_dataset.parquet"
 
 # Output folders
 TRAIN_DIR = "./train_dataset/"
@@ -14,9 +22,11 @@ os.makedirs(TRAIN_DIR, exist_ok=True)
 os.makedirs(TEST_DIR, exist_ok=True)
 
 # Load balanced dataset
-df = pd.read_csv(INPUT_FILE)
+df = read_table(INPUT_FILE)
+report_memory("balanced dataset", df)
 
 # Split into train and test (80% train, 20% test) with stratification
+mark("split")
 train_df, test_df = train_test_split(
     df,
     test_size=0.2,
@@ -25,11 +35,17 @@ train_df, test_df = train_test_split(
 )
 
 # Save the splits
-train_file = os.path.join(TRAIN_DIR, "train.csv")
-test_file = os.path.join(TEST_DIR, "test.csv")
+train_file = os.path.join(TRAIN_DIR, "train.parquet")
+test_file = os.path.join(TEST_DIR, "test.parquet")
+
+# CSV copies only with --csv
+mark("write tables")
+write_table(train_df, train_file)
+write_table(test_df, test_file)
 
-train_df.to_csv(train_file, index=False)
-test_df.to_csv(test_file, index=False)
+# Scaled and raw .npy matrices + fitted scaler, memory-mapped by the trainers
+mark("write cache")
+write_cache(train_df, test_df)
 
 print(f"✅ Train dataset saved to {train_file}")
 print(f"✅ Test dataset saved to {test_file}")
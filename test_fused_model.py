@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+from xgboost import XGBClassifier
+
+from fused_model import export_fused, FusedBoosterPredictor, NumpyTreePredictor
+
+
+def synthetic_flows(n, seed):
+    """Integer-valued features: flag counts and multiples of a segment size.
+
+    Split thresholds land exactly on feature values, which is where a naively
+    unscaled float32 threshold sends rows the other way.
+    """
+    rng = np.random.default_rng(seed)
+    units = np.float32([1, 7, 100, 1, 7, 100])
+    X = rng.poisson(3, size=(n, len(units))).astype(np.float32) * units
+    y = (X[:, 0] + rng.normal(0, 1, n) > X[:, 1] / units[1]).astype(int)
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def fused(tmp_path_factory):
+    X, y = synthetic_flows(4000, seed=0)
+    scaler = StandardScaler().fit(X.astype(np.float64))
+    model = XGBClassifier(n_estimators=40, max_depth=4, random_state=42)
+    model.fit(scaler.transform(X.astype(np.float64)), y)
+    out = tmp_path_factory.mktemp("fused")
+    booster_file, arrays_file = str(out / "fused_model.ubj"), str(out / "fused_model.npz")
+    export_fused(model, scaler, booster_file, arrays_file)
+    return model, scaler, {
+        "xgboost": FusedBoosterPredictor.load(booster_file),
+        "numpy": NumpyTreePredictor.load(arrays_file),
+    }
+
+
+@pytest.mark.parametrize("name", ["xgboost", "numpy"])
+@pytest.mark.parametrize("seed", [0, 1])  # Training rows and unseen rows
+def test_fused_matches_scaler_plus_model(fused, name, seed):
+    model, scaler, predictors = fused
+    X, _ = synthetic_flows(2000, seed=seed)
+    expected = model.predict_proba(scaler.transform(X.astype(np.float64)))[:, 1]
+    got = predictors[name].predict_proba(X)[:, 1]
+    np.testing.assert_array_equal(got >= 0.5, expected >= 0.5)
+    np.testing.assert_allclose(got, expected, atol=1e-5)
@@ -0,0 +1,110 @@
+import threading
+import time
+import numpy as np
+
+# name -> (seconds per slot, slots kept): 10 minutes by second, 1 day by minute, 30 days by hour
+RESOLUTIONS = {
+    "1s": (1, 600),
+    "1m": (60, 1440),
+    "1h": (3600, 720),
+}
+
+# Summed per slot; latency mean = latency_sum / latency_count
+METRICS = ["benign", "malicious", "flows", "bytes", "latency_sum", "latency_count"]
+_COL = {name: i for i, name in enumerate(METRICS)}
+
+
+class RingSeries:
+    """Fixed-size ring of time slots at one resolution.
+
+    Slot `i` of the ring holds the bucket `t // step` with `bucket % slots == i`;
+    `buckets` remembers which one, so a slot left over from an earlier lap of
+    the ring is zeroed when it is reused (on write) or ignored (on read).
+    Updates are O(1) and memory is fixed at `slots` rows.
+    """
+
+    def __init__(self, step, slots):
+        self.step = step
+        self.slots = slots
+        self.values = np.zeros((slots, len(METRICS)), dtype=np.float64)
+        self.latency_max = np.zeros(slots, dtype=np.float64)
+        self.buckets = np.full(slots, -1, dtype=np.int64)
+
+    def add(self, t, row, latency_max):
+        bucket = int(t // self.step)
+        i = bucket % self.slots
+        if self.buckets[i] != bucket:
+            self.buckets[i] = bucket
+            self.values[i] = 0
+            self.latency_max[i] = 0
+        self.values[i] += row
+        if latency_max > self.latency_max[i]:
+            self.latency_max[i] = latency_max
+
+    def window(self, now, last=None):
+        """The last `last` slots up to `now`, oldest first; missing slots read as zero."""
+        last = self.slots if last is None else max(1, min(last, self.slots))
+        end = int(now // self.step)
+        wanted = np.arange(end - last + 1, end + 1)
+        idx = wanted % self.slots
+        live = self.buckets[idx] == wanted
+        values = np.where(live[:, None], self.values[idx], 0.0)
+        latency_max = np.where(live, self.latency_max[idx], 0.0)
+        return wanted * self.step, values, latency_max
+
+
+class TrafficStats:
+    """Rolling benign/malicious/flow/byte counts and verdict latency at several resolutions.
+
+    record() is called with each batch of labelled flows from the live loop;
+    query() returns one resolution as JSON-ready points for the dashboard.
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.series = {name: RingSeries(step, slots) for name, (step, slots) in resolutions.items()}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, flows, now=None):
+        now = time.time() if now is None else now
+        row = np.zeros(len(METRICS))
+        latency_max = 0.0
+        for f in flows:
+            label = f.get("label")
+            if label == "Benign":
+                row[_COL["benign"]] += 1
+            elif label == "Malicious":
+                row[_COL["malicious"]] += 1
+            row[_COL["flows"]] += 1
+            row[_COL["bytes"]] += f.get("bytes", 0)
+            latency = f.get("latency_ms")
+            if latency is not None:
+                row[_COL["latency_sum"]] += latency
+                row[_COL["latency_count"]] += 1
+                latency_max = max(latency_max, latency)
+        with self._lock:
+            for series in self.series.values():
+                series.add(now, row, latency_max)
+
+    def query(self, resolution="1s", last=None, now=None):
+        if resolution not in self.series:
+            raise KeyError(f"Unknown resolution {resolution!r}, expected one of {sorted(self.series)}")
+        now = time.time() if now is None else now
+        series = self.series[resolution]
+        with self._lock:
+            starts, values, latency_max = series.window(now, last)
+        count = values[:, _COL["latency_count"]]
+        latency_mean = np.divide(values[:, _COL["latency_sum"]], count, out=np.zeros_like(count), where=count > 0)
+        points = [
+            {
+                "t": int(t),
+                "benign": int(v[_COL["benign"]]),
+                "malicious": int(v[_COL["malicious"]]),
+                "flows": int(v[_COL["flows"]]),
+                "bytes": int(v[_COL["bytes"]]),
+                "latency_mean_ms": round(float(mean), 3),
+                "latency_max_ms": round(float(peak), 3),
+            }
+            for t, v, mean, peak in zip(starts, values, latency_mean, latency_max)
+        ]
+        return {"resolution": resolution, "step": series.step, "points": points}
@@ -0,0 +1,88 @@
+import os
+import json
+import joblib
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from dataset_io import read_table
+from schema import MODEL_DTYPE, scale_for_model
+
+# ---------------------------
+# Paths
+# ---------------------------
+TRAIN_FILE = "./train_dataset/train.parquet"
+TEST_FILE = "./test_dataset/test.parquet"
+CACHE_DIR = "./train_cache/"
+
+# Arrays written by write_cache(), one .npy file each
+ARRAYS = ["X_train", "X_test", "X_train_raw", "X_test_raw", "y_train", "y_test"]
+
+
+def source_stamp(paths):
+    """Size and mtime of the split tables the cache was built from."""
+    return {p: [os.stat(p).st_size, os.stat(p).st_mtime_ns] for p in paths if os.path.exists(p)}
+
+
+def write_cache(train_df, test_df, cache_dir=CACHE_DIR, sources=(TRAIN_FILE, TEST_FILE)):
+    """Fit the scaler once and save raw and scaled matrices as .npy files.
+
+    Raw features are kept too: the fused-model parity check needs them.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    X_train_raw = train_df.drop(columns=["label"])
+    X_test_raw = test_df.drop(columns=["label"])
+    scaler = StandardScaler()
+    arrays = {
+        "X_train": scale_for_model(scaler, X_train_raw, fit=True),
+        "X_test": scale_for_model(scaler, X_test_raw),
+        "X_train_raw": X_train_raw.to_numpy(dtype=MODEL_DTYPE),
+        "X_test_raw": X_test_raw.to_numpy(dtype=MODEL_DTYPE),
+        "y_train": train_df["label"].to_numpy(dtype=np.int8),
+        "y_test": test_df["label"].to_numpy(dtype=np.int8),
+    }
+    for name, arr in arrays.items():
+        np.save(os.path.join(cache_dir, name + ".npy"), arr)
+    joblib.dump(scaler, os.path.join(cache_dir, "scaler.pkl"))
+    meta = {"features": list(X_train_raw.columns), "sources": source_stamp(sources)}
+    # meta.json last: a cache without it is incomplete and gets rebuilt
+    with open(os.path.join(cache_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=1)
+    print(f"✅ Training cache saved to {cache_dir} ({len(train_df)} train / {len(test_df)} test rows)")
+    return cache_dir
+
+
+def is_fresh(cache_dir=CACHE_DIR, sources=(TRAIN_FILE, TEST_FILE), allow_unstamped=False):
+    """True if the cache was built from `sources` as they are now.
+
+    A cache written without the split tables (e.g. copied in) has no stamp
+    to check, so it counts as stale unless `allow_unstamped` is set.
+    """
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if not meta["sources"]:
+        return allow_unstamped
+    return meta["sources"] == source_stamp(sources)
+
+
+class TrainingData:
+    """Memory-mapped training arrays plus the scaler fitted on them."""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            self.features = json.load(f)["features"]
+        for name in ARRAYS:
+            # mmap_mode="r": no parse, no copy; pages are read on first touch
+            setattr(self, name, np.load(os.path.join(cache_dir, name + ".npy"), mmap_mode="r"))
+        self.scaler = joblib.load(os.path.join(cache_dir, "scaler.pkl"))
+
+
+def load_training_data(cache_dir=CACHE_DIR, train_file=TRAIN_FILE, test_file=TEST_FILE,
+                       allow_unstamped=False):
+    """Open the training cache, rebuilding it first if the split tables changed."""
+    if not is_fresh(cache_dir, (train_file, test_file), allow_unstamped):
+        print(f"🔹 Training cache missing or stale, building it from {train_file} and {test_file}")
+        write_cache(read_table(train_file), read_table(test_file), cache_dir, (train_file, test_file))
+    return TrainingData(cache_dir)
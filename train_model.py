@@ -1,112 +1,252 @@
 import os
 import time
+import json
+import hashlib
+import argparse
+import joblib
 import pandas as pd
-from sklearn.model_selection import cross_val_score
-from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import StratifiedKFold
 from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.ensemble import RandomForestClassifier
 from xgboost import XGBClassifier
 from lightgbm import LGBMClassifier
 from catboost import CatBoostClassifier
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 import numpy as np
+from parallel import add_jobs_argument, ordered_map, resolve_jobs
+from profiling import add_profile_argument, start_profile, mark
+from schema import report_memory
+from train_cache import load_training_data, CACHE_DIR
 
 # ---------------------------
 # File paths
 # ---------------------------
-TRAIN_FILE = "./train_dataset/train.csv"
-TEST_FILE = "./test_dataset/test.csv"
 OUTPUT_CSV = "./dashboard_csvfiles/model_results.csv"
+MODEL_CACHE_DIR = "./results/model_cache/"
 
-# ---------------------------
-# Load datasets
-# ---------------------------
-train_df = pd.read_csv(TRAIN_FILE)
-test_df = pd.read_csv(TEST_FILE)
-
-y_train = train_df["label"].values
-y_test = test_df["label"].values
-
-X_train = train_df.drop(columns=["label"])
-X_test = test_df.drop(columns=["label"])
-
-# ---------------------------
-# Scale features
-# ---------------------------
-scaler = StandardScaler()
-X_train = scaler.fit_transform(X_train)
-X_test = scaler.transform(X_test)
+CV_FOLDS = 5
+attack_label = 1
 
 # ---------------------------
 # Models to train
 # ---------------------------
-attack_label = 1
-models = {
-    "Logistic Regression": LogisticRegression(max_iter=1000),
-    "Random Forest": RandomForestClassifier(n_estimators=100, random_state=42),
-    "XGBoost": XGBClassifier(eval_metric="logloss", use_label_encoder=False),
-    "LightGBM": LGBMClassifier(random_state=42),
-    "CatBoost": CatBoostClassifier(verbose=0, random_state=42)
+# name -> (short name, factory taking a thread count)
+MODELS = {
+    "Logistic Regression": ("lr", lambda threads: LogisticRegression(max_iter=1000)),
+    "Random Forest": ("rf", lambda threads: RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=threads)),
+    "XGBoost": ("xgb", lambda threads: XGBClassifier(eval_metric="logloss", use_label_encoder=False, n_jobs=threads)),
+    "LightGBM": ("lgbm", lambda threads: LGBMClassifier(random_state=42, n_jobs=threads)),
+    "CatBoost": ("cat", lambda threads: CatBoostClassifier(verbose=0, random_state=42, thread_count=threads)),
 }
-
-# Ensemble (Voting Classifier)
-ensemble = VotingClassifier(
-    estimators=[
-        ("lr", LogisticRegression(max_iter=1000)),
-        ("rf", RandomForestClassifier(n_estimators=100, random_state=42)),
-        ("xgb", XGBClassifier(eval_metric="logloss", use_label_encoder=False)),
-        ("lgbm", LGBMClassifier(random_state=42)),
-        ("cat", CatBoostClassifier(verbose=0, random_state=42))
-    ],
-    voting="soft"  # "hard" for majority vote, "soft" for probability averaging
-)
-
-models["Ensemble (Voting)"] = ensemble
-
-# ---------------------------
-# Train models and collect results
-# ---------------------------
-results_list = []
-
-for name, model in models.items():
-    print(f"\n🔹 Training {name}...")
-
-    # Measure time
-    start_time = time.time()
-
-    # Cross-validation
-    cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring="accuracy")
-    print(f"   CV Accuracy: {np.mean(cv_scores):.4f} ± {np.std(cv_scores):.4f}")
-
-    # Train on full training data
-    model.fit(X_train, y_train)
-    y_pred = model.predict(X_test)
-
-    # Measure elapsed time
-    elapsed_time = time.time() - start_time
-
-    # Calculate metrics
+THREAD_PARAMS = {"n_jobs", "thread_count"}
+
+
+def make_model(name, threads=1):
+    return MODELS[name][1](threads)
+
+
+def cache_key(name, cache_dir=CACHE_DIR):
+    """Hash of the model's parameters and of the training data it is fitted on."""
+    params = {k: v for k, v in make_model(name).get_params().items() if k not in THREAD_PARAMS}
+    with open(os.path.join(cache_dir, "meta.json")) as f:
+        data_meta = f.read()
+    blob = json.dumps({"model": name, "params": repr(sorted(params.items())),
+                       "folds": CV_FOLDS, "data": data_meta}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+def fold_indices(y, folds=CV_FOLDS):
+    # Same splitter cross_val_score(cv=5) used for classifiers
+    return list(StratifiedKFold(n_splits=folds).split(np.zeros(len(y)), y))
+
+
+def run_task(task):
+    """Worker: fit one model on one CV fold (or on the full training set).
+
+    Returns the predicted attack probabilities with fit and predict times.
+    The training cache is memory-mapped, so every worker shares its pages.
+    """
+    name, fold, threads = task
+    data = load_training_data()
+    model = make_model(name, threads)
+    if fold is None:
+        X_fit, y_fit, X_eval = data.X_train, data.y_train, data.X_test
+    else:
+        train_idx, val_idx = fold_indices(data.y_train)[fold]
+        X_fit, y_fit, X_eval = data.X_train[train_idx], data.y_train[train_idx], data.X_train[val_idx]
+
+    start = time.perf_counter()
+    model.fit(X_fit, y_fit)
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    proba = model.predict_proba(X_eval)[:, 1]
+    predict_time = time.perf_counter() - start
+    return name, fold, proba, fit_time, predict_time, model if fold is None else None
+
+
+def cached_path(name, key):
+    return os.path.join(MODEL_CACHE_DIR, f"{MODELS[name][0]}-{key}")
+
+
+def load_cached(name, key):
+    path = cached_path(name, key)
+    if not (os.path.exists(path + ".npz") and os.path.exists(path + ".pkl")):
+        return None
+    arrays = np.load(path + ".npz")
+    return {k: arrays[k] for k in arrays.files}
+
+
+def save_cached(name, key, entry, model):
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    path = cached_path(name, key)
+    joblib.dump(model, path + ".pkl")
+    np.savez(path + ".npz", **entry)
+
+
+def compare_models(jobs=1, cpus=0):
+    """Fit every (model, fold) pair across a process pool.
+
+    Each task's model gets cpus // jobs threads, so the total stays within
+    the CPU budget. Out-of-fold and test probabilities and the fitted models
+    are cached per model in MODEL_CACHE_DIR and reused on later runs.
+    """
+    data = load_training_data()
+    report_memory("training cache opened")
+    n_train = len(data.y_train)
+    folds = fold_indices(data.y_train)
+
+    jobs = resolve_jobs(jobs)
+    threads = max(1, resolve_jobs(cpus) // jobs)
+    entries = {}
+    keys = {}
+    tasks = []
+    for name in MODELS:
+        keys[name] = cache_key(name)
+        cached = load_cached(name, keys[name])
+        if cached is not None:
+            print(f"🔹 {name}: reusing cached folds and fitted model")
+            entries[name] = cached
+            continue
+        entries[name] = {
+            "oof": np.zeros(n_train), "test": None,
+            "fold_fit": np.zeros(CV_FOLDS), "fold_predict": np.zeros(CV_FOLDS),
+            "fit": np.zeros(1), "predict": np.zeros(1),
+        }
+        tasks += [(name, fold, threads) for fold in range(CV_FOLDS)] + [(name, None, threads)]
+
+    mark("fit models")
+    if tasks:
+        print(f"\n🔹 Fitting {len(tasks)} model/fold tasks on {jobs} worker(s) x {threads} thread(s)...")
+    for name, fold, proba, fit_time, predict_time, model in ordered_map(run_task, tasks, jobs, tasks_per_child=None):
+        entry = entries[name]
+        if fold is None:
+            entry["test"], entry["fit"][0], entry["predict"][0] = proba, fit_time, predict_time
+            save_cached(name, keys[name], entry, model)
+        else:
+            entry["oof"][folds[fold][1]] = proba
+            entry["fold_fit"][fold], entry["fold_predict"][fold] = fit_time, predict_time
+    return data, folds, entries
+
+
+def fold_accuracy(y, proba, folds):
+    return np.array([accuracy_score(y[val], proba[val] >= 0.5) for _, val in folds])
+
+
+def result_row(name, y_test, test_proba, cv_scores, fit_time, predict_time, cv_time):
+    y_pred = (test_proba >= 0.5).astype(int)
     acc = accuracy_score(y_test, y_pred)
     prec = precision_score(y_test, y_pred, pos_label=attack_label)
     rec = recall_score(y_test, y_pred, pos_label=attack_label)
     f1 = f1_score(y_test, y_pred, pos_label=attack_label)
-
-    print(f"✅ {name} Results: Accuracy={acc:.4f}, Precision={prec:.4f}, Recall={rec:.4f}, F1={f1:.4f}, Time={elapsed_time:.2f}s")
-
-    # Append results
-    results_list.append({
+    print(f"   CV Accuracy: {np.mean(cv_scores):.4f} ± {np.std(cv_scores):.4f}")
+    print(f"✅ {name} Results: Accuracy={acc:.4f}, Precision={prec:.4f}, Recall={rec:.4f}, F1={f1:.4f}, "
+          f"Fit={fit_time:.2f}s, Predict={predict_time:.3f}s")
+    return {
         "Model": name,
         "Accuracy": acc,
         "Precision": prec,
         "Recall": rec,
         "F1-score": f1,
-        "Time (s)": elapsed_time
-    })
-
-# ---------------------------
-# Save results to CSV
-# ---------------------------
-os.makedirs(os.path.dirname(OUTPUT_CSV), exist_ok=True)
-results_df = pd.DataFrame(results_list)
-results_df.to_csv(OUTPUT_CSV, index=False)
-print(f"\n✅ Results saved to {OUTPUT_CSV}")
+        "CV Accuracy": np.mean(cv_scores),
+        "Fit time (s)": fit_time,
+        "Predict time (s)": predict_time,
+        "CV time (s)": cv_time,
+    }
+
+
+def ensemble_rows(data, folds, entries):
+    """Soft voting and stacking built from the cached probabilities; nothing is refitted.
+
+    The stacker is a logistic regression over the base models' out-of-fold
+    probabilities, so it never sees a prediction made on its own training rows.
+    """
+    names = list(entries)
+    oof = np.column_stack([entries[n]["oof"] for n in names])
+    test = np.column_stack([entries[n]["test"] for n in names])
+    base_fit = sum(float(entries[n]["fit"][0]) for n in names)
+    base_predict = sum(float(entries[n]["predict"][0]) for n in names)
+    base_cv = sum(float(entries[n]["fold_fit"].sum() + entries[n]["fold_predict"].sum()) for n in names)
+    y_train, y_test = np.asarray(data.y_train), np.asarray(data.y_test)
+
+    rows = []
+    print("\n🔹 Ensemble (Voting) from cached probabilities...")
+    start = time.perf_counter()
+    vote = test.mean(axis=1)
+    combine = time.perf_counter() - start
+    rows.append(result_row("Ensemble (Voting)", y_test, vote, fold_accuracy(y_train, oof.mean(axis=1), folds),
+                           base_fit, base_predict + combine, base_cv))
+
+    print("\n🔹 Ensemble (Stacking) from out-of-fold probabilities...")
+    # Meta-model CV: refit the cheap stacker per fold on the other folds' OOF rows
+    stack_cv = np.zeros(len(y_train))
+    for train_idx, val_idx in folds:
+        meta = LogisticRegression().fit(oof[train_idx], y_train[train_idx])
+        stack_cv[val_idx] = meta.predict_proba(oof[val_idx])[:, 1]
+    start = time.perf_counter()
+    meta = LogisticRegression().fit(oof, y_train)
+    meta_fit = time.perf_counter() - start
+    start = time.perf_counter()
+    stacked = meta.predict_proba(test)[:, 1]
+    meta_predict = time.perf_counter() - start
+    rows.append(result_row("Ensemble (Stacking)", y_test, stacked, fold_accuracy(y_train, stack_cv, folds),
+                           base_fit + meta_fit, base_predict + meta_predict, base_cv))
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    joblib.dump({"models": names, "meta": meta}, os.path.join(MODEL_CACHE_DIR, "stacking_meta.pkl"))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = add_jobs_argument(argparse.ArgumentParser(description="Compare models with cross-validation"))
+    parser.add_argument("--cpus", type=int, default=0,
+                        help="Total CPU budget shared by the workers (0 = all cores)")
+    parser.add_argument("--csv", action="store_true",
+                        help="Accepted from pipeline.py --csv; results are always written as CSV")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    start_profile("train_model", "load cache")
+
+    start_time = time.perf_counter()
+    data, folds, entries = compare_models(args.jobs, args.cpus)
+    y_train, y_test = np.asarray(data.y_train), np.asarray(data.y_test)
+
+    # ---------------------------
+    # Collect results
+    # ---------------------------
+    mark("metrics and ensembles")
+    results_list = []
+    for name, entry in entries.items():
+        print(f"\n🔹 {name}")
+        cv_time = float(entry["fold_fit"].sum() + entry["fold_predict"].sum())
+        results_list.append(result_row(name, y_test, entry["test"], fold_accuracy(y_train, entry["oof"], folds),
+                                       float(entry["fit"][0]), float(entry["predict"][0]), cv_time))
+    results_list += ensemble_rows(data, folds, entries)
+    print(f"\n⏱️ Wall time: {time.perf_counter() - start_time:.1f}s")
+
+    # ---------------------------
+    # Save results to CSV
+    # ---------------------------
+    mark("save")
+    os.makedirs(os.path.dirname(OUTPUT_CSV), exist_ok=True)
+    results_df = pd.DataFrame(results_list)
+    results_df.to_csv(OUTPUT_CSV, index=False)
+    print(f"\n✅ Results saved to {OUTPUT_CSV}")
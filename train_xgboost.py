@@ -1,51 +1,69 @@
 import pandas as pd
 import os
 import joblib
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
 import seaborn as sns
 import matplotlib.pyplot as plt
 from xgboost import XGBClassifier
+from schema import report_memory
+from train_cache import load_training_data
+from fused_model import (export_fused, verify_parity, FusedBoosterPredictor, NumpyTreePredictor,
+                         FUSED_BOOSTER_FILE, FUSED_ARRAYS_FILE)
+from profiling import start_profile, mark
 
 # Paths
-TRAIN_FILE = "./train_dataset/train.csv"
-TEST_FILE = "./test_dataset/test.csv"
 MODEL_FILE = "./results/xgboost_model.pkl"
+MODEL_UBJ_FILE = "./results/xgboost_model.ubj"  # Native format, loads much faster than the pickle
 CONF_MATRIX_FILE = "./results/xgboost_confusion_matrix.png"
 
 # Create results folder
 os.makedirs("./results", exist_ok=True)
 
-# Load datasets
-train_df = pd.read_csv(TRAIN_FILE)
-test_df = pd.read_csv(TEST_FILE)
+# --profile writes per-stage timings to results/profiles/
+start_profile("train_xgboost", "load cache")
 
-# Features and labels
-X_train = train_df.drop(columns=["label"])
-y_train = train_df["label"]   # Already 0/1
-X_test = test_df.drop(columns=["label"])
-y_test = test_df["label"]     # Already 0/1
+# Load datasets: memory-mapped matrices and the scaler fitted by split_dataset.py
+data = load_training_data()
+X_train, y_train = data.X_train, data.y_train   # Already scaled, labels 0/1
+X_test, y_test = data.X_test, data.y_test
+scaler = data.scaler
+report_memory("training cache opened")
 
-# Scale features
-scaler = StandardScaler()
-X_train = scaler.fit_transform(X_train)
-X_test = scaler.transform(X_test)
+# Unscaled test features for the fused predictor parity check
+X_test_raw = data.X_test_raw
 
 # ------------------------
 # Train XGBoost Model
 # ------------------------
+mark("fit")
 print("\n🔹 Training XGBoost...")
 model = XGBClassifier(eval_metric="logloss", use_label_encoder=False, random_state=42)
 model.fit(X_train, y_train)
 
 # Save the model & scaler
+mark("save")
 joblib.dump(model, MODEL_FILE)
 joblib.dump(scaler, "./results/scaler.pkl")
-print(f"✅ Model saved to {MODEL_FILE}")
+model.save_model(MODEL_UBJ_FILE)
+print(f"✅ Model saved to {MODEL_FILE} and {MODEL_UBJ_FILE}")
+
+# ------------------------
+# Export fused predictor (scaler folded into the trees)
+# ------------------------
+mark("export fused + parity")
+print("\n🔹 Exporting fused predictor...")
+export_fused(model, scaler)
+print(f"✅ Fused predictor saved to {FUSED_BOOSTER_FILE} and {FUSED_ARRAYS_FILE}")
+print("🔹 Parity check against scaler + model:")
+verify_parity(model, scaler, X_test_raw, {
+    "xgboost": FusedBoosterPredictor.load(FUSED_BOOSTER_FILE),
+    "numpy": NumpyTreePredictor.load(FUSED_ARRAYS_FILE),
+})
 
 # ------------------------
 # Load Model & Evaluate
 # ------------------------
+mark("evaluate")
 print("\n🔹 Loading saved model...")
 loaded_model = joblib.load(MODEL_FILE)
 scaler = joblib.load("./results/scaler.pkl")
@@ -65,6 +83,7 @@ print(f"   Recall   : {rec:.4f}")
 print(f"   F1-score : {f1:.4f}")
 
 # Confusion Matrix
+mark("confusion matrix")
 cm = confusion_matrix(y_test, y_pred)
 plt.figure(figsize=(6, 5))
 sns.heatmap(cm, annot=True, fmt="d", cmap="Blues", xticklabels=["Benign (0)", "Attack (1)"], yticklabels=["Benign (0)", "Attack (1)"])
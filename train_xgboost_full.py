@@ -0,0 +1,240 @@
+import os
+import time
+import shutil
+import argparse
+import joblib
+import numpy as np
+import xgboost as xgb
+from xgboost import XGBClassifier
+from sklearn.preprocessing import StandardScaler
+
+from dataset_io import list_tables, iter_table_chunks, normalize_labels
+from dedup import row_hashes
+from flows import FLOW_FEATURES
+from schema import scale_for_model, report_memory
+from fused_model import (export_fused, verify_parity, FusedBoosterPredictor, NumpyTreePredictor,
+                         FUSED_BOOSTER_FILE, FUSED_ARRAYS_FILE)
+
+# ---------------------------
+# Paths and defaults
+# ---------------------------
+FEATURES_DIR = "./features/"
+# Kept apart from train_xgboost.py's model; --promote copies it to where the live path loads from
+FULL_DIR = "./results/full/"
+LIVE_DIR = "./results/"
+MODEL_FILE = os.path.join(FULL_DIR, "xgboost_model.pkl")
+MODEL_UBJ_FILE = os.path.join(FULL_DIR, "xgboost_model.ubj")
+SCALER_FILE = os.path.join(FULL_DIR, "scaler.pkl")
+FULL_BOOSTER_FILE = os.path.join(FULL_DIR, os.path.basename(FUSED_BOOSTER_FILE))
+FULL_ARRAYS_FILE = os.path.join(FULL_DIR, os.path.basename(FUSED_ARRAYS_FILE))
+PROMOTED_FILES = [MODEL_FILE, MODEL_UBJ_FILE, SCALER_FILE, FULL_BOOSTER_FILE, FULL_ARRAYS_FILE]
+CACHE_PREFIX = "./results/xgb_extmem/cache"
+
+CHUNK_ROWS = 500_000
+HOLDOUT = 0.02          # Share of rows kept out of training for evaluation
+PARITY_ROWS = 100_000   # Holdout rows kept in memory for the fused parity check
+NUM_ROUNDS = 100        # XGBClassifier's default n_estimators
+PARAMS = {
+    "objective": "binary:logistic",
+    "eval_metric": "logloss",
+    "tree_method": "hist",
+    "max_bin": 256,
+    "seed": 42,
+}
+
+
+def split_chunk(chunk, holdout=HOLDOUT):
+    """Features, 0/1 labels and a holdout mask for one chunk.
+
+    The holdout is chosen by row hash, so it does not depend on chunk
+    boundaries or file order and is the same on every pass and every run.
+    """
+    X = chunk[FLOW_FEATURES]
+    y = normalize_labels(chunk["label"]).to_numpy()
+    is_holdout = (row_hashes(X) % 10_000) < holdout * 10_000
+    return X, y, is_holdout
+
+
+def iter_corpus(files, chunk_rows=CHUNK_ROWS, holdout=HOLDOUT, train=True):
+    """(X, y) chunks of the training (or holdout) rows of every day file."""
+    for path in files:
+        for chunk in iter_table_chunks(path, chunk_rows, columns=FLOW_FEATURES + ["label"]):
+            X, y, is_holdout = split_chunk(chunk, holdout)
+            keep = ~is_holdout if train else is_holdout
+            if keep.any():
+                yield X[keep], y[keep]
+
+
+def corpus_stats(files, chunk_rows=CHUNK_ROWS, holdout=HOLDOUT):
+    """One pass: fit the scaler incrementally and count rows per class."""
+    scaler = StandardScaler()
+    counts = np.zeros(2, dtype=np.int64)
+    for X, y in iter_corpus(files, chunk_rows, holdout):
+        scaler.partial_fit(X.to_numpy(dtype=np.float64))
+        counts += np.bincount(y, minlength=2)
+    return scaler, counts
+
+
+def class_weights(counts):
+    """'balanced' weights: n / (classes * n_class), so both classes weigh the same in total."""
+    counts = np.maximum(counts, 1)
+    return counts.sum() / (len(counts) * counts)
+
+
+class CorpusIter(xgb.DataIter):
+    """Feeds XGBoost one scaled, weighted chunk at a time.
+
+    XGBoost calls next() until it returns False and reset() between passes,
+    so only one chunk is held in memory at a time.
+    """
+
+    def __init__(self, files, scaler, weights, chunk_rows=CHUNK_ROWS, holdout=HOLDOUT, cache_prefix=None):
+        self.files = files
+        self.scaler = scaler
+        self.weights = weights
+        self.chunk_rows = chunk_rows
+        self.holdout = holdout
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = iter_corpus(self.files, self.chunk_rows, self.holdout)
+        try:
+            X, y = next(self._chunks)
+        except StopIteration:
+            return False
+        input_data(data=scale_for_model(self.scaler, X), label=y, weight=self.weights[y])
+        return True
+
+    def reset(self):
+        self._chunks = None
+
+
+def evaluate(booster, scaler, files, chunk_rows=CHUNK_ROWS, holdout=HOLDOUT, keep_rows=PARITY_ROWS):
+    """Streamed confusion counts on the holdout, plus a raw sample for the parity check."""
+    tp = fp = tn = fn = 0
+    sample = []
+    kept = 0
+    for X, y in iter_corpus(files, chunk_rows, holdout, train=False):
+        X_raw = X.to_numpy(dtype=np.float32)
+        pred = booster.inplace_predict(scale_for_model(scaler, X_raw)) >= 0.5
+        tp += int(np.sum(pred & (y == 1)))
+        fp += int(np.sum(pred & (y == 0)))
+        tn += int(np.sum(~pred & (y == 0)))
+        fn += int(np.sum(~pred & (y == 1)))
+        if kept < keep_rows:
+            sample.append(X_raw[:keep_rows - kept])
+            kept += len(sample[-1])
+    total = tp + fp + tn + fn
+    metrics = {
+        "rows": total,
+        "accuracy": (tp + tn) / total if total else 0.0,
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / (tp + fn) if tp + fn else 0.0,
+    }
+    p, r = metrics["precision"], metrics["recall"]
+    metrics["f1"] = 2 * p * r / (p + r) if p + r else 0.0
+    X_sample = np.concatenate(sample) if sample else np.empty((0, len(FLOW_FEATURES)), np.float32)
+    return metrics, X_sample
+
+
+def train_full(files, rounds=NUM_ROUNDS, chunk_rows=CHUNK_ROWS, holdout=HOLDOUT, external_memory=True,
+               nthread=None):
+    print(f"🔹 Pass 1/2: scaler and class counts over {len(files)} day files...")
+    start = time.perf_counter()
+    scaler, counts = corpus_stats(files, chunk_rows, holdout)
+    weights = class_weights(counts)
+    print(f"   Training rows: benign={counts[0]}, attack={counts[1]}; "
+          f"class weights: benign={weights[0]:.3f}, attack={weights[1]:.3f} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    print(f"🔹 Pass 2/2: building the {'external-memory' if external_memory else 'in-memory'} quantile matrix...")
+    start = time.perf_counter()
+    params = dict(PARAMS, nthread=nthread) if nthread else dict(PARAMS)
+    if external_memory:
+        os.makedirs(os.path.dirname(CACHE_PREFIX), exist_ok=True)
+        it = CorpusIter(files, scaler, weights, chunk_rows, holdout, cache_prefix=CACHE_PREFIX)
+        dtrain = xgb.ExtMemQuantileDMatrix(it, max_bin=params["max_bin"], nthread=nthread)
+    else:
+        # Quantized in memory: about one byte per feature per row
+        it = CorpusIter(files, scaler, weights, chunk_rows, holdout)
+        dtrain = xgb.QuantileDMatrix(it, max_bin=params["max_bin"], nthread=nthread)
+    print(f"   {dtrain.num_row()} rows x {dtrain.num_col()} features ({time.perf_counter() - start:.1f}s)")
+    report_memory("quantile matrix built")
+
+    print(f"🔹 Training {rounds} rounds (hist)...")
+    start = time.perf_counter()
+    booster = xgb.train(params, dtrain, num_boost_round=rounds)
+    print(f"   Done in {time.perf_counter() - start:.1f}s")
+    report_memory("training done")
+    return booster, scaler
+
+
+def save_model(booster, scaler):
+    """Save in the same formats as train_xgboost.py, under FULL_DIR."""
+    os.makedirs(os.path.dirname(MODEL_UBJ_FILE), exist_ok=True)
+    booster.save_model(MODEL_UBJ_FILE)
+    model = XGBClassifier()
+    model.load_model(MODEL_UBJ_FILE)
+    joblib.dump(model, MODEL_FILE)
+    joblib.dump(scaler, SCALER_FILE)
+    print(f"✅ Model saved to {MODEL_FILE} and {MODEL_UBJ_FILE}, scaler to {SCALER_FILE}")
+    export_fused(model, scaler, FULL_BOOSTER_FILE, FULL_ARRAYS_FILE)
+    print(f"✅ Fused predictor saved to {FULL_BOOSTER_FILE} and {FULL_ARRAYS_FILE}")
+    return model
+
+
+def promote(files=PROMOTED_FILES, live_dir=LIVE_DIR):
+    """Copy the full-corpus model over the live one (the files train_xgboost.py writes)."""
+    missing = [f for f in files if not os.path.exists(f)]
+    if missing:
+        raise SystemExit(f"⚠️ Nothing to promote, missing: {', '.join(missing)}")
+    for path in files:
+        target = os.path.join(live_dir, os.path.basename(path))
+        # Copy next to the target, then swap it in: the live path never loads a partial file
+        shutil.copy2(path, target + ".tmp")
+        os.replace(target + ".tmp", target)
+    print(f"✅ Promoted the full-corpus model from {FULL_DIR} to {live_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train XGBoost on every processed day, in bounded memory")
+    parser.add_argument("--rounds", type=int, default=NUM_ROUNDS)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--holdout", type=float, default=HOLDOUT, help="Share of rows held out for evaluation")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="Quantize into RAM (QuantileDMatrix) instead of paging from disk")
+    parser.add_argument("--nthread", type=int, default=None)
+    parser.add_argument("--csv", action="store_true",
+                        help="Accepted from pipeline.py --csv; this script writes no tables")
+    parser.add_argument("--promote", action="store_true",
+                        help=f"Don't train: copy the model last trained here from {FULL_DIR} to {LIVE_DIR}")
+    args = parser.parse_args()
+    if args.promote:
+        promote()
+        raise SystemExit(0)
+
+    start = time.perf_counter()
+    files = [os.path.join(FEATURES_DIR, f) for f in list_tables(FEATURES_DIR)]
+    if not files:
+        raise SystemExit(f"⚠️ No feature tables found in {FEATURES_DIR}, run features.py first")
+    booster, scaler = train_full(files, args.rounds, args.chunk_rows, args.holdout,
+                                 external_memory=not args.in_memory, nthread=args.nthread)
+    model = save_model(booster, scaler)
+
+    print("\n🔹 Evaluating on the holdout...")
+    metrics, X_sample = evaluate(booster, scaler, files, args.chunk_rows, args.holdout)
+    print(f"✅ XGBoost (full corpus) on {metrics['rows']} holdout rows:")
+    print(f"   Accuracy : {metrics['accuracy']:.4f}")
+    print(f"   Precision: {metrics['precision']:.4f}")
+    print(f"   Recall   : {metrics['recall']:.4f}")
+    print(f"   F1-score : {metrics['f1']:.4f}")
+
+    print("🔹 Parity check against scaler + model:")
+    verify_parity(model, scaler, X_sample, {
+        "xgboost": FusedBoosterPredictor.load(FULL_BOOSTER_FILE),
+        "numpy": NumpyTreePredictor.load(FULL_ARRAYS_FILE),
+    })
+    print(f"🔹 The live path still loads {LIVE_DIR}; run with --promote to switch it to this model")
+    report_memory(f"finished in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,291 @@
+import os
+import math
+import json
+import time
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import StratifiedShuffleSplit
+from sklearn.metrics import f1_score, precision_score, recall_score
+
+from parallel import add_jobs_argument, ordered_map, resolve_jobs
+from train_cache import load_training_data
+
+# ---------------------------
+# Paths and defaults
+# ---------------------------
+OUTPUT_DIR = "./results/tuning/"
+TRIALS_CSV = os.path.join(OUTPUT_DIR, "trials.csv")
+PARETO_CSV = os.path.join(OUTPUT_DIR, "pareto_front.csv")
+BEST_JSON = os.path.join(OUTPUT_DIR, "best_params.json")
+BEST_MODEL = os.path.join(OUTPUT_DIR, "best_model.pkl")
+
+VALIDATION_SHARE = 0.2   # Held out of train.parquet for early stopping and scoring
+MAX_ROUNDS = 2000        # Upper bound; early stopping picks the real number
+EARLY_STOPPING = 30
+LATENCY_CALLS = 200
+SEED = 42
+
+# Detection floor, size budget and how much F1 one millisecond of latency is worth
+MIN_F1 = 0.95
+MAX_SIZE_MB = 50.0
+LATENCY_WEIGHT = 0.01
+
+SEARCH_SPACES = {
+    "xgboost": {
+        "max_depth": [3, 4, 6, 8, 10],
+        "learning_rate": [0.03, 0.1, 0.3],
+        "min_child_weight": [1, 5, 20],
+        "subsample": [0.7, 1.0],
+        "colsample_bytree": [0.6, 0.8, 1.0],
+        "max_bin": [64, 128, 256],
+    },
+    "lightgbm": {
+        "num_leaves": [7, 15, 31, 63, 127],
+        "learning_rate": [0.03, 0.1, 0.3],
+        "min_child_samples": [10, 20, 50],
+        "subsample": [0.7, 1.0],
+        "subsample_freq": [1],
+        "colsample_bytree": [0.6, 0.8, 1.0],
+    },
+}
+
+
+# ---------------------------
+# Candidates
+# ---------------------------
+def available_families(families):
+    """Families whose library is installed; LightGBM is optional here."""
+    usable = []
+    for family in families:
+        try:
+            __import__("xgboost" if family == "xgboost" else "lightgbm")
+            usable.append(family)
+        except ImportError:
+            print(f"⚠️ {family} is not installed, leaving it out of the search")
+    return usable
+
+
+def sample_candidates(n, families, seed=SEED, start_id=0):
+    rng = np.random.default_rng(seed)
+    candidates = []
+    for i in range(n):
+        family = families[i % len(families)]
+        params = {k: v[rng.integers(len(v))] for k, v in SEARCH_SPACES[family].items()}
+        params = {k: v.item() if hasattr(v, "item") else v for k, v in params.items()}
+        candidates.append({"id": start_id + i, "family": family, "params": params})
+    return candidates
+
+
+def make_model(family, params):
+    # One thread per model: the process pool provides the parallelism
+    if family == "xgboost":
+        from xgboost import XGBClassifier
+        return XGBClassifier(n_estimators=MAX_ROUNDS, early_stopping_rounds=EARLY_STOPPING,
+                             eval_metric="logloss", tree_method="hist", n_jobs=1,
+                             random_state=SEED, **params)
+    from lightgbm import LGBMClassifier
+    return LGBMClassifier(n_estimators=MAX_ROUNDS, n_jobs=1, random_state=SEED, verbose=-1, **params)
+
+
+def fit_early_stopping(model, family, X, y, X_val, y_val):
+    if family == "xgboost":
+        model.fit(X, y, eval_set=[(X_val, y_val)], verbose=False)
+        return int(model.best_iteration) + 1
+    import lightgbm
+    model.fit(X, y, eval_set=[(X_val, y_val)],
+              callbacks=[lightgbm.early_stopping(EARLY_STOPPING, verbose=False)])
+    return int(model.best_iteration_)
+
+
+# ---------------------------
+# Evaluation
+# ---------------------------
+def split_indices(y, seed=SEED):
+    """Fixed train/validation split of the cached training rows, with the
+    training part in a fixed random order so rungs take nested prefixes."""
+    train_idx, val_idx = next(StratifiedShuffleSplit(n_splits=1, test_size=VALIDATION_SHARE,
+                                                     random_state=seed).split(np.zeros(len(y)), y))
+    return np.random.default_rng(seed).permutation(train_idx), np.sort(val_idx)
+
+
+def row_latency_ms(model, X, calls=LATENCY_CALLS):
+    """Median single-row predict_proba latency in milliseconds."""
+    rows = [X[i % len(X)][None, :] for i in range(calls)]
+    model.predict_proba(rows[0])
+    times = np.empty(calls)
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        model.predict_proba(row)
+        times[i] = time.perf_counter() - start
+    return float(np.median(times) * 1e3)
+
+
+def evaluate_candidate(task):
+    """Worker: fit one candidate on the first `rows` training rows and measure it."""
+    candidate, rows, seed = task
+    data = load_training_data()
+    y_all = np.asarray(data.y_train)
+    train_idx, val_idx = split_indices(y_all, seed)
+    fit_idx = np.sort(train_idx[:rows])
+    X, y = data.X_train[fit_idx], y_all[fit_idx]
+    X_val, y_val = data.X_train[val_idx], y_all[val_idx]
+
+    model = make_model(candidate["family"], candidate["params"])
+    start = time.perf_counter()
+    rounds = fit_early_stopping(model, candidate["family"], X, y, X_val, y_val)
+    fit_time = time.perf_counter() - start
+    y_pred = model.predict(X_val)
+    blob = pickle.dumps(model)
+    return {
+        "id": candidate["id"],
+        "family": candidate["family"],
+        "params": json.dumps(candidate["params"], sort_keys=True),
+        "rows": len(fit_idx),
+        "rounds": rounds,
+        "f1": f1_score(y_val, y_pred),
+        "precision": precision_score(y_val, y_pred, zero_division=0),
+        "recall": recall_score(y_val, y_pred, zero_division=0),
+        "latency_ms": row_latency_ms(model, X_val),
+        "size_mb": len(blob) / 2**20,
+        "fit_time": fit_time,
+    }, blob
+
+
+class Objective:
+    """F1 minus a latency penalty; candidates below the F1 floor or over the
+    size budget are ranked after every feasible one."""
+
+    def __init__(self, min_f1=MIN_F1, max_size_mb=MAX_SIZE_MB, latency_weight=LATENCY_WEIGHT):
+        self.min_f1 = min_f1
+        self.max_size_mb = max_size_mb
+        self.latency_weight = latency_weight
+
+    def feasible(self, r):
+        return r["f1"] >= self.min_f1 and r["size_mb"] <= self.max_size_mb
+
+    def __call__(self, r):
+        score = r["f1"] - self.latency_weight * r["latency_ms"]
+        return score if self.feasible(r) else score - 1e6
+
+
+# ---------------------------
+# Search
+# ---------------------------
+def rung_sizes(min_rows, max_rows, eta):
+    """max_rows / eta^k for k = n..0, the smallest still at least min_rows."""
+    n = int(math.log(max_rows / min_rows, eta) + 1e-9) if max_rows > min_rows else 0
+    return [int(max_rows / eta ** k) for k in range(n, -1, -1)]
+
+
+def successive_halving(candidates, min_rows, max_rows, eta, objective, jobs=1, seed=SEED, trials=None):
+    """Evaluate every candidate on min_rows, keep the best 1/eta, multiply the
+    rows by eta, and repeat until one candidate has seen max_rows."""
+    trials = [] if trials is None else trials
+    alive = list(candidates)
+    for rung, rows in enumerate(rung_sizes(min_rows, max_rows, eta)):
+        print(f"🔹 Rung {rung}: {len(alive)} candidate(s) on {rows} rows")
+        scored = []
+        for record, blob in ordered_map(evaluate_candidate, [(c, rows, seed) for c in alive], jobs):
+            record["rung"] = rung
+            record["score"] = objective(record)
+            record["feasible"] = objective.feasible(record)
+            trials.append(record)
+            scored.append((record["score"], record, blob))
+        scored.sort(key=lambda s: -s[0])
+        top = scored[0][1]
+        print(f"   best: #{top['id']} {top['family']} F1={top['f1']:.4f} "
+              f"latency={top['latency_ms']:.3f}ms size={top['size_mb']:.2f}MB")
+        keep = {r["id"] for _, r, _ in scored[:max(1, len(scored) // eta)]}
+        alive = [c for c in alive if c["id"] in keep]
+    return trials, top, scored[0][2]
+
+
+def hyperband(families, min_rows, max_rows, eta, objective, jobs=1, seed=SEED):
+    """Run successive halving brackets from many cheap to few expensive candidates."""
+    s_max = int(math.log(max_rows / min_rows, eta) + 1e-9)
+    trials = []
+    best = None
+    next_id = 0
+    for s in range(s_max, -1, -1):
+        n = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+        start_rows = max(min_rows, int(max_rows / eta ** s))
+        print(f"\n📊 Bracket s={s}: {n} candidate(s) starting at {start_rows} rows")
+        candidates = sample_candidates(n, families, seed + s, start_id=next_id)
+        next_id += n
+        trials, top, blob = successive_halving(candidates, start_rows, max_rows, eta, objective, jobs, seed, trials)
+        if best is None or top["score"] > best[0]["score"]:
+            best = (top, blob)
+    return trials, best[0], best[1]
+
+
+def pareto_front(trials):
+    """Candidates at their largest rung that no other candidate beats on F1,
+    latency and size at once."""
+    df = pd.DataFrame(trials).sort_values("rows").groupby("id").tail(1)
+    points = df[["f1", "latency_ms", "size_mb"]].to_numpy()
+    keep = []
+    for i, (f1, lat, size) in enumerate(points):
+        dominated = ((points[:, 0] >= f1) & (points[:, 1] <= lat) & (points[:, 2] <= size)
+                     & ((points[:, 0] > f1) | (points[:, 1] < lat) | (points[:, 2] < size)))
+        keep.append(not dominated.any())
+    return df[keep].sort_values("latency_ms")
+
+
+if __name__ == "__main__":
+    parser = add_jobs_argument(argparse.ArgumentParser(
+        description="Successive-halving / Hyperband search over XGBoost and LightGBM"))
+    parser.add_argument("--families", nargs="+", default=["xgboost", "lightgbm"], choices=list(SEARCH_SPACES))
+    parser.add_argument("--candidates", type=int, default=27, help="Candidates for plain successive halving")
+    parser.add_argument("--hyperband", action="store_true", help="Run Hyperband brackets instead")
+    parser.add_argument("--eta", type=int, default=3, help="Keep 1/eta of the candidates per rung")
+    parser.add_argument("--min-rows", type=int, default=5000, help="Training rows at the first rung")
+    parser.add_argument("--min-f1", type=float, default=MIN_F1, help="Detection floor on validation F1")
+    parser.add_argument("--max-size-mb", type=float, default=MAX_SIZE_MB)
+    parser.add_argument("--latency-weight", type=float, default=LATENCY_WEIGHT,
+                        help="F1 points given up per millisecond of single-row latency")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    families = available_families(args.families)
+    if not families:
+        raise SystemExit("⚠️ No model library available to tune")
+    n_fit = len(split_indices(np.asarray(load_training_data().y_train), args.seed)[0])
+    min_rows = min(args.min_rows, n_fit)
+    objective = Objective(args.min_f1, args.max_size_mb, args.latency_weight)
+    if resolve_jobs(args.jobs) > 1:
+        print("🔹 Latency is measured while other workers run; rerun the front with -j 1 for clean numbers")
+
+    start = time.perf_counter()
+    if args.hyperband:
+        trials, final, best_blob = hyperband(families, min_rows, n_fit, args.eta, objective, args.jobs, args.seed)
+    else:
+        candidates = sample_candidates(args.candidates, families, args.seed)
+        trials, final, best_blob = successive_halving(candidates, min_rows, n_fit, args.eta, objective,
+                                               args.jobs, args.seed)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    trials_df = pd.DataFrame(trials)
+    trials_df.to_csv(TRIALS_CSV, index=False)
+    front = pareto_front(trials)
+    front.to_csv(PARETO_CSV, index=False)
+
+    print(f"\n📊 Pareto front (F1 vs latency vs size), {len(front)} candidate(s):")
+    for _, r in front.iterrows():
+        flag = "✅" if r["feasible"] else "  "
+        print(f"   {flag} #{r['id']:<4} {r['family']:<9} F1={r['f1']:.4f} latency={r['latency_ms']:.3f}ms "
+              f"size={r['size_mb']:.2f}MB rows={r['rows']} rounds={r['rounds']}")
+
+    if not final["feasible"]:
+        print(f"⚠️ No candidate reached F1 >= {args.min_f1} within {args.max_size_mb} MB")
+    with open(BEST_JSON, "w") as f:
+        json.dump({"family": final["family"], "params": json.loads(final["params"]),
+                   "n_estimators": int(final["rounds"]), "f1": float(final["f1"]),
+                   "latency_ms": float(final["latency_ms"]), "size_mb": float(final["size_mb"]),
+                   "feasible": bool(final["feasible"])}, f, indent=1)
+    with open(BEST_MODEL, "wb") as f:
+        f.write(best_blob)
+    print(f"\n✅ Best: #{final['id']} {final['family']} {final['params']}")
+    print(f"✅ Trials saved to {TRIALS_CSV}, Pareto front to {PARETO_CSV}, best to {BEST_JSON} and {BEST_MODEL}")
+    print(f"⏱️ Wall time: {time.perf_counter() - start:.1f}s")